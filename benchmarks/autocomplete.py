@@ -0,0 +1,52 @@
+"""
+Measures the latency of the schools autocompletion, for each keystroke of
+typical queries.
+
+Usage, from the repository root:
+    python -m benchmarks.autocomplete
+"""
+import time
+
+from mp2i import STATIC_DIR
+from mp2i.utils.search import SearchIndex
+
+QUERIES = ["ecole polytechnique", "Lycée Louis-le-Grand", "centrale", "telecom"]
+ROUNDS = 100
+
+
+def keystrokes(query: str):
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+
+def measure(index: SearchIndex, clear: bool) -> float:
+    """
+    Returns the average time of a search in microseconds
+    """
+    start = time.perf_counter()
+    count = 0
+    for _ in range(ROUNDS):
+        if clear:
+            index._cache.clear()
+        for query in QUERIES:
+            for prefix in keystrokes(query):
+                index.search(prefix)
+                count += 1
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main() -> None:
+    for filename in ("cpge.txt", "engineering.txt"):
+        with open(STATIC_DIR / "text" / filename, encoding="utf-8") as f:
+            names = f.read().splitlines()
+        start = time.perf_counter()
+        index = SearchIndex(names)
+        build = (time.perf_counter() - start) * 1e3
+        print(
+            f"{filename} ({len(names)} names, index built in {build:.1f}ms)\n"
+            f"  uncached: {measure(index, clear=True):>8.1f} µs/search\n"
+            f"  cached:   {measure(index, clear=False):>8.1f} µs/search"
+        )
+
+
+if __name__ == "__main__":
+    main()
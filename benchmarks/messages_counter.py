@@ -0,0 +1,92 @@
+"""
+Compares the write throughput of databases for the messages counter workload.
+
+Usage, from the repository root:
+    python -m benchmarks.messages_counter [DATABASE_URL ...]
+
+Each url is benchmarked in its own process because the engine is created when
+mp2i.utils.database is imported. Defaults to a temporary SQLite database.
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+GUILD_ID = 1  # Guild created for the benchmark and deleted with its members after
+MEMBERS = 2000
+MESSAGES = 100_000
+UNBUFFERED_MESSAGES = 2000  # One UPDATE per message, as before the counter
+CHUNK_SIZE = 250
+
+
+async def benchmark() -> None:
+    from sqlalchemy import delete, insert, update
+
+    from mp2i.models import ActivityModel, GuildModel, MemberModel
+    from mp2i.utils import database
+    from mp2i.utils.counters import MessagesCounter
+
+    await database.execute_async(
+        insert(GuildModel).values(id=GUILD_ID, name="benchmark")
+    )
+    members = [{"id": i, "guild_id": GUILD_ID, "name": str(i)} for i in range(MEMBERS)]
+    for i in range(0, MEMBERS, CHUNK_SIZE):
+        await database.execute_async(
+            insert(MemberModel.__table__).values(members[i : i + CHUNK_SIZE])
+        )
+    try:
+        counter = MessagesCounter()
+        start = time.perf_counter()
+        for _ in range(MESSAGES):
+            await counter.increment(GUILD_ID, 0, random.randrange(MEMBERS))
+        await counter.flush()
+        buffered = MESSAGES / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(UNBUFFERED_MESSAGES):
+            await database.execute_async(
+                update(MemberModel)
+                .where(
+                    MemberModel.id == random.randrange(MEMBERS),
+                    MemberModel.guild_id == GUILD_ID,
+                )
+                .values(messages_count=MemberModel.messages_count + 1)
+            )
+        unbuffered = UNBUFFERED_MESSAGES / (time.perf_counter() - start)
+    finally:
+        await database.execute_async(
+            delete(ActivityModel).where(ActivityModel.guild_id == GUILD_ID)
+        )
+        await database.execute_async(
+            delete(MemberModel).where(MemberModel.guild_id == GUILD_ID)
+        )
+        await database.execute_async(
+            delete(GuildModel).where(GuildModel.id == GUILD_ID)
+        )
+        await database.close()
+
+    print(
+        f"{database.engine.url.render_as_string(hide_password=True)}\n"
+        f"  buffered:   {buffered:>10,.0f} messages/s\n"
+        f"  unbuffered: {unbuffered:>10,.0f} messages/s\n"
+        f"  pool:       {database.pool_status()}"
+    )
+
+
+def main() -> None:
+    if sys.argv[1:] == ["--run"]:
+        asyncio.run(benchmark())
+        return
+
+    default_url = f"sqlite:///{tempfile.gettempdir()}/mp2i-benchmark.db"
+    for url in sys.argv[1:] or [default_url]:
+        env = {**os.environ, "DATABASE_URL": url}
+        command = [sys.executable, "-m", "benchmarks.messages_counter", "--run"]
+        subprocess.run(command, env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
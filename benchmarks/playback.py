@@ -0,0 +1,61 @@
+"""
+Measures the CPU time spent to play an audio file in each playback mode of
+the music cog: in the bot process (reading frames, encoding PCM to Opus)
+and in FFmpeg. FFmpeg and libopus must be installed.
+
+Usage, from the repository root, with a file downloaded from YouTube:
+    python -m benchmarks.playback audio.webm [seconds]
+"""
+import asyncio
+import resource
+import sys
+import time
+
+import discord
+
+from mp2i.cogs.music import audio_source
+
+FRAME_DURATION = 0.02  # Seconds of audio in a frame
+
+
+def children_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(path: str, playback: str, seconds: float) -> tuple:
+    """
+    Returns the CPU time of the bot and of FFmpeg to play the file, in seconds
+    """
+    codec, _ = asyncio.run(discord.FFmpegOpusAudio.probe(path))
+    encoder = discord.opus.Encoder()
+    bot_start, ffmpeg_start = time.process_time(), children_time()
+
+    source = asyncio.run(audio_source(path, codec, playback, before_options=""))
+    for _ in range(int(seconds / FRAME_DURATION)):
+        if not (data := source.read()):
+            break
+        if not source.is_opus():  # Encoded by the voice client of discord.py
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+    source.cleanup()  # Waits for FFmpeg, so that its time is counted
+
+    return time.process_time() - bot_start, children_time() - ffmpeg_start
+
+
+def main() -> None:
+    path = sys.argv[1]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 60
+    if not discord.opus.is_loaded():
+        discord.opus._load_default()
+
+    print(f"CPU time to play {seconds:.0f}s of {path}")
+    for playback in ("opus", "pcm"):
+        bot, ffmpeg = measure(path, playback, seconds)
+        print(
+            f"  {playback}: {bot:>6.2f}s bot + {ffmpeg:>6.2f}s FFmpeg = "
+            f"{(bot + ffmpeg) / seconds:>6.1%} of a core"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ import os
 import discord
 from discord.ext import commands
 
-from mp2i.utils import database, resolver
+from mp2i.utils import database, executors, migrations, resolver
 
 # Create a logger for this file, __name__ will take the package name if this file
 # will do not run as a script
@@ -19,6 +19,8 @@ async def run(token=None) -> None:
     """
     # Try to connect to the database or raise error
     database.test_connection()
+    # Brings existing databases up to date (indexes, columns...)
+    migrations.upgrade()
 
     # Create a bot instance and activate all intents (more access to members infos)
     bot = commands.Bot(
@@ -27,8 +29,14 @@ async def run(token=None) -> None:
         self_bot=False,
         help_command=None,
     )
-    # loads all available cogs
-    for cog in resolver.find_available_cogs():
-        await bot.load_extension(cog.__name__)
+    try:
+        # Closing the bot unloads cogs, which lets them flush their pending writes
+        async with bot:
+            # loads all available cogs
+            for cog in resolver.find_available_cogs():
+                await bot.load_extension(cog.__name__)
 
-    await bot.start(token or TOKEN)  # raise LoginFailure if the token is invalid
+            await bot.start(token or TOKEN)  # raise LoginFailure if token is invalid
+    finally:
+        executors.shutdown()
+        await database.close()
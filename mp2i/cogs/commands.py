@@ -1,9 +1,9 @@
 import re
 import logging
 from typing import Optional
-from operator import attrgetter
 
 import discord
+from discord.app_commands import Choice, choices
 from discord.ext.commands import Cog, Range
 from discord.ext.commands import (
     hybrid_command,
@@ -16,11 +16,41 @@ from discord.ext.commands import (
 from mp2i.wrappers.guild import GuildWrapper
 from mp2i.wrappers.member import MemberWrapper
 from mp2i.utils import youtube
+from mp2i.utils.counters import current_hour, hourly_cutoff
 from mp2i.utils.discord import defer, has_any_role
 
 logger = logging.getLogger(__name__)
 
 LEADERBOARD_RANK_MAX = 50
+STATS_TOP = 5
+# Hours covered by each period of /leaderboard and /stats
+PERIODS = {"day": 24, "week": 24 * 7, "month": 24 * 30}
+PERIOD_CHOICES = [
+    Choice(name="Depuis toujours", value="all"),
+    Choice(name="Dernières 24 heures", value="day"),
+    Choice(name="7 derniers jours", value="week"),
+    Choice(name="30 derniers jours", value="month"),
+]
+PERIOD_TITLES = {
+    "all": "",
+    "day": " (24 heures)",
+    "week": " (7 jours)",
+    "month": " (30 jours)",
+}
+PERIOD_ERROR = f"La période doit être parmi : {', '.join(PERIOD_TITLES)}"
+
+
+def period_start(period: str) -> Optional[int]:
+    """
+    Returns the first hour of the period, None if it covers all the activity.
+    Activity compacted by day can't be split, a period starting in such a day
+    starts with the whole day.
+    """
+    if period not in PERIODS:
+        return None
+    if (start := current_hour() - PERIODS[period] + 1) < hourly_cutoff():
+        return start // 24 * 24
+    return start
 
 
 class Commands(Cog):
@@ -57,15 +87,14 @@ class Commands(Cog):
         query : str
             Mots clés de la vidéo.
         """
+        if not (videos := await youtube.search(query, n=1)):
+            await ctx.reply("Changement de statut du bot impossible.", ephemeral=True)
+            return
         try:
-            video = next(youtube.search(query, n=1))
-            activity = discord.Streaming(**video)
+            activity = discord.Streaming(**videos[0])
             await self.bot.change_presence(activity=activity)
             await ctx.reply("Status changé.", ephemeral=True)
 
-        except StopIteration:
-            await ctx.reply("Changement de statut du bot impossible.", ephemeral=True)
-
         except discord.errors.HTTPException:
             logger.error("Can't change bot presence")
 
@@ -123,7 +152,7 @@ class Commands(Cog):
         member : discord.Member
             Membre à consulter.
         """
-        member = MemberWrapper(member or ctx.author)
+        member = await MemberWrapper.fetch(member or ctx.author)
         embed = discord.Embed(title="Profil", colour=int(member.profile_color, 16))
         embed.set_author(name=member.name)
         if member.avatar is None:
@@ -159,7 +188,7 @@ class Commands(Cog):
         member = MemberWrapper(ctx.author)
         hexa_color = color.upper().strip("#")
         if re.match(r"^[0-9A-F]{6}$", hexa_color):
-            member.profile_color = color.upper().strip("#")
+            await member.update(profile_color=hexa_color)
             await ctx.reply(
                 f"Couleur de profil changée en #{hexa_color}.", ephemeral=True
             )
@@ -172,7 +201,7 @@ class Commands(Cog):
         """
         Affiche des informations sur les roles du serveur.
         """
-        guild = GuildWrapper(ctx.guild)
+        guild = GuildWrapper.get(ctx.guild)
         embed = discord.Embed(title="Infos du serveur", colour=0xFFA325)
         embed.set_author(name=guild.name)
         embed.set_thumbnail(url=guild.icon.url)
@@ -189,7 +218,10 @@ class Commands(Cog):
     @hybrid_command(name="leaderboard")
     @guild_only()
     @defer()
-    async def leaderboard(self, ctx, rmax: Optional[int] = 10) -> None:
+    @choices(period=PERIOD_CHOICES)
+    async def leaderboard(
+        self, ctx, rmax: Optional[int] = 10, period: str = "all"
+    ) -> None:
         """
         Affiche le classement des membres par nombre de messages.
 
@@ -197,28 +229,77 @@ class Commands(Cog):
         ----------
         rmax : int
             Rang maximal (compris entre 0 et 50)
+        period : str
+            La période sur laquelle les messages sont comptés (par défaut, toujours)
         """
         if rmax < 0 or rmax > LEADERBOARD_RANK_MAX:
             message = f"rmax doit être compris entre 0 et {LEADERBOARD_RANK_MAX}"
             return await ctx.reply(message, ephemeral=True)
-
-        members = [MemberWrapper(m) for m in ctx.guild.members if not m.bot]
-        members.sort(key=attrgetter("messages_count"), reverse=True)
-
-        author = MemberWrapper(ctx.author)
-        rank = members.index(author) + 1
-        content = f"→ {rank}. **{author.name}** : {author.messages_count} messages\n\n"
+        if period not in PERIOD_TITLES:
+            return await ctx.reply(PERIOD_ERROR, ephemeral=True)
+
+        guild = GuildWrapper.get(ctx.guild)
+        since = period_start(period)
+        content = ""
+        if rank := await guild.leaderboard_rank(ctx.author.id, since):
+            content = (
+                f"→ {rank.rank}. **{ctx.author.name}** : "
+                f"{rank.messages_count} messages\n\n"
+            )
 
         if rmax == 0:
-            title = "Votre classement dans le serveur :"
+            title = f"Votre classement dans le serveur{PERIOD_TITLES[period]} :"
+            rows = []
         else:
-            title = f"Top {rmax} des membres du serveur"
+            title = f"Top {rmax} des membres du serveur{PERIOD_TITLES[period]}"
+            rows = await guild.leaderboard(rmax, since)
 
-        for r, member in enumerate(members[:rmax], 1):
-            content += f"{r}. **{member.name}** : {member.messages_count} messages\n"
+        for r, row in enumerate(rows, 1):
+            name = m.name if (m := ctx.guild.get_member(row.id)) else row.name
+            content += f"{r}. **{name}** : {row.messages_count} messages\n"
 
         embed = discord.Embed(colour=0x2BFAFA, title=title, description=content)
         await ctx.send(embed=embed)
 
+    @hybrid_command(name="stats")
+    @guild_only()
+    @defer()
+    @choices(period=PERIOD_CHOICES)
+    async def stats(self, ctx, period: str = "week") -> None:
+        """
+        Affiche l'activité du serveur : nombre de messages, salons et membres actifs.
+
+        Parameters
+        ----------
+        period : str
+            La période sur laquelle les messages sont comptés (par défaut, 7 jours)
+        """
+        if period not in PERIOD_TITLES:
+            return await ctx.reply(PERIOD_ERROR, ephemeral=True)
+        guild = GuildWrapper.get(ctx.guild)
+        # Activity is counted by hour since its creation, "all" reads every bucket
+        since = period_start(period) or 0
+        total = await guild.messages_total(since)
+        channels = await guild.channels_activity(STATS_TOP, since)
+        members = await guild.leaderboard(STATS_TOP, since)
+
+        embed = discord.Embed(
+            colour=0x2BFAFA,
+            title=f"Activité du serveur{PERIOD_TITLES[period]}",
+            description=f"**{total}** messages",
+        )
+        channels_content = "\n".join(
+            f"{r}. <#{row.id}> : {row.messages_count} messages"
+            for r, row in enumerate(channels, 1)
+        )
+        embed.add_field(name="Salons", value=channels_content or "Aucun", inline=False)
+        members_content = "\n".join(
+            f"{r}. <@{row.id}> : {row.messages_count} messages"
+            for r, row in enumerate(members, 1)
+        )
+        embed.add_field(name="Membres", value=members_content or "Aucun", inline=False)
+        await ctx.send(embed=embed)
+
+
 async def setup(bot) -> None:
     await bot.add_cog(Commands(bot))
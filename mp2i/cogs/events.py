@@ -2,21 +2,65 @@ import logging
 from datetime import datetime
 
 import discord
+from discord.ext import tasks
 from discord.ext.commands import Cog
 from sqlalchemy import delete
 
-from mp2i.models import GuildModel
-from mp2i.utils import database
-from mp2i.wrappers.member import MemberWrapper
+from mp2i.models import ActivityModel, GuildModel
+from mp2i.utils import database, outbox
+from mp2i.utils.cache import members_cache
+from mp2i.utils.counters import messages_counter, rollup_activity
+from mp2i.utils.messages import message_cache
+from mp2i.utils.reactions import reaction_router
+from mp2i.wrappers.member import MemberWrapper, register_members
 from mp2i.wrappers.guild import GuildWrapper
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_FLUSH_INTERVAL = 30  # seconds
+
 
 class EventsCog(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self) -> None:
+        self.flush_messages_count.start()
+        self.rollup_activity.start()
+
+    async def cog_unload(self) -> None:
+        """
+        Writes pending messages counts before the bot stops.
+        """
+        self.flush_messages_count.cancel()
+        self.rollup_activity.cancel()
+        await messages_counter.flush()
+        logger.info(
+            f"Reactions handled and dropped by route: {reaction_router.stats()}"
+        )
+        logger.info(f"Members cache: {members_cache.stats()}")
+        logger.info(f"Messages cache: {message_cache.stats()}")
+        await outbox.close()
+        logger.info(f"Log embeds sent and dropped by channel: {outbox.stats()}")
+
+    async def send_log(self, guild: GuildWrapper, embed: discord.Embed) -> None:
+        """
+        Queues an embed for the log channel, embeds are sent in batches
+        """
+        queue = outbox.get_queue(self.bot, guild.log_channel, guild.config.log_webhook)
+        await queue.put(embed)
+
+    @tasks.loop(seconds=MESSAGES_FLUSH_INTERVAL)
+    async def flush_messages_count(self) -> None:
+        await messages_counter.flush()
+
+    @tasks.loop(hours=1)
+    async def rollup_activity(self) -> None:
+        """
+        Compacts old hourly activity into daily activity.
+        """
+        await rollup_activity()
+
     @Cog.listener()
     async def on_ready(self) -> None:
         """
@@ -24,50 +68,102 @@ class EventsCog(Cog):
         """
         await self.bot.tree.sync()  # Sync the command tree
 
-        for guild in map(GuildWrapper, self.bot.guilds):
+        for guild in self.bot.guilds:
+            guild = await GuildWrapper.fetch(guild)
             if not guild.exists():
-                guild.register()
-            for member in map(MemberWrapper, guild.members):
-                if not member.exists():
-                    member.register()
+                await guild.register()
+        # Loads all registered members in one query and inserts the missing ones
+        await register_members(m for g in self.bot.guilds for m in g.members)
 
         print(f"\n{' READY ':>^80}\n")
 
     @Cog.listener()
     async def on_message(self, msg: discord.Message) -> None:
         """
-        Log message in database and update message count
+        Update message count, written later in bulk by the messages counter
+        """
+        if msg.guild is not None:
+            await messages_counter.increment(
+                msg.guild.id, msg.channel.id, msg.author.id
+            )
+
+    @Cog.listener()
+    async def on_raw_reaction_add(self, payload) -> None:
+        """
+        Routes the reaction to the handler of its message or of its emoji
         """
-        member = MemberWrapper(msg.author)
-        if member.exists():
-            member.messages_count += 1
+        message_cache.on_reaction_add(payload, me=payload.user_id == self.bot.user.id)
+        await reaction_router.dispatch(payload)
+
+    @Cog.listener()
+    async def on_raw_reaction_remove(self, payload) -> None:
+        message_cache.on_reaction_remove(
+            payload, me=payload.user_id == self.bot.user.id
+        )
+
+    @Cog.listener()
+    async def on_raw_reaction_clear(self, payload) -> None:
+        message_cache.on_reaction_clear(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload) -> None:
+        message_cache.on_reaction_clear(payload.message_id, str(payload.emoji))
+
+    @Cog.listener()
+    async def on_raw_message_edit(self, payload) -> None:
+        message_cache.on_message_edit(payload)
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload) -> None:
+        message_cache.remove(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload) -> None:
+        for message_id in payload.message_ids:
+            message_cache.remove(message_id)
 
     @Cog.listener()
     async def on_guild_join(self, guild) -> None:
         """
         When client is invited to a guild, register all members in database
         """
-        guild = GuildWrapper(guild)
-        guild.register()
-
-        for member in map(MemberWrapper, guild.members):
-            member.register()
+        guild = GuildWrapper.get(guild)
+        await guild.register()
+        await register_members(guild.members)
 
     @Cog.listener()
     async def on_guild_remove(self, guild) -> None:
         """
         When client is removed from a guild
         """
-        database.execute(delete(GuildModel).where(GuildModel.id == guild.id))
+        GuildWrapper.invalidate(guild.id)
+        members_cache.clear()  # Members of the guild are deleted in cascade
+        await database.execute_async(
+            delete(GuildModel).where(GuildModel.id == guild.id)
+        )
+        await database.execute_async(
+            delete(ActivityModel).where(ActivityModel.guild_id == guild.id)
+        )
+
+    @Cog.listener()
+    async def on_guild_role_create(self, role) -> None:
+        GuildWrapper.get(role.guild).clear_roles_id()
+
+    @Cog.listener()
+    async def on_guild_role_delete(self, role) -> None:
+        """
+        Roles checks resolve qualifiers to role ids again
+        """
+        GuildWrapper.get(role.guild).clear_roles_id()
 
     @Cog.listener()
     async def on_member_join(self, member) -> None:
         """
         When a member join a guild, insert it in database or restore its roles
         """
-        member = MemberWrapper(member)
+        member = await MemberWrapper.fetch(member)
         if not member.exists():
-            member.register()
+            await member.register()
 
         text = f"{member.mention} a rejoint le serveur {member.guild.name}!"
         embed = discord.Embed(
@@ -90,19 +186,23 @@ class EventsCog(Cog):
         """
         Check if a member has updated roles and modifies them in the database
         """
-        if before.roles == after.roles or not (member := MemberWrapper(after)).exists():
+        if before.roles == after.roles:
+            return
+        if not (member := await MemberWrapper.fetch(after)).exists():
             return
 
-        for qualifier in GuildWrapper(after.guild).choiceable_roles:
+        for qualifier in GuildWrapper.get(after.guild).choiceable_roles:
             if discord.utils.get(after.roles, name=qualifier):
-                return member.update(role=qualifier)
+                return await member.update(role=qualifier)
 
     @Cog.listener()
     async def on_message_delete(self, msg: discord) -> None:
         """
         When a message is deleted, send logs in the log channel
         """
-        guild = GuildWrapper(msg.guild)
+        if msg.guild is None:
+            return
+        guild = GuildWrapper.get(msg.guild)
         if not guild.log_channel:
             return
 
@@ -120,15 +220,17 @@ class EventsCog(Cog):
             name="Message original", value=f">>> {msg.content}", inline=False
         )
         embed.set_footer(text=self.bot.user.name)
-        await guild.log_channel.send(embed=embed)
+        await self.send_log(guild, embed)
 
     @Cog.listener()
     async def on_message_edit(self, before, after) -> None:
         """
         When a message is edited, send logs in the log channel
         """
-        guild = GuildWrapper(before.guild)
-        if not before.guild or not (log_chan := guild.log_channel):
+        if not before.guild:
+            return
+        guild = GuildWrapper.get(before.guild)
+        if not guild.log_channel:
             return
         
         if before.channel == guild.admin_channel or before.author.bot:
@@ -145,7 +247,7 @@ class EventsCog(Cog):
             name="Message original", value=f">>> {before.content}", inline=False
         )
         embed.set_footer(text=self.bot.user.name)
-        await log_chan.send(embed=embed)
+        await self.send_log(guild, embed)
 
 
 async def setup(bot) -> None:
@@ -1,9 +1,12 @@
 from operator import attrgetter
-from typing import Optional
+from typing import Dict, FrozenSet, Optional, Set, Tuple
 
 import discord
 from discord.ext.commands import Cog, CommandError, hybrid_command, guild_only
 
+from mp2i.utils.cache import LRUCache
+from mp2i.wrappers.guild import GuildWrapper
+
 
 class Help(Cog):
     """
@@ -12,6 +15,54 @@ class Help(Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        # Commands lists by guild and by what their checks depend on
+        self.lists = LRUCache(maxsize=256)
+        self.commands_help: Dict[str, discord.Embed] = {}
+        self.commands_ids: FrozenSet[int] = frozenset()
+        self.checks_qualifiers: Set[Tuple[str, ...]] = set()
+
+    def _refresh(self) -> None:
+        """
+        Drops cached lists and builds the help of each command again when
+        commands have changed, after a cog was loaded, reloaded or unloaded
+        """
+        commands_ids = frozenset(map(id, self.bot.commands))
+        if commands_ids == self.commands_ids:
+            return
+        self.commands_ids = commands_ids
+        self.lists.clear()
+        self.commands_help = {}
+        self.checks_qualifiers = {
+            check.qualifiers
+            for command in self.bot.commands
+            for check in command.checks
+            if hasattr(check, "qualifiers")
+        }
+        for command in self.bot.commands:
+            embed = discord.Embed(
+                title=f"Commande `/{command.name}`",
+                description=command.help,
+                color=0xEE22EE,
+            )
+            for name in (command.name, *command.aliases):
+                self.commands_help[name] = embed
+
+    async def _list_key(self, ctx) -> Tuple:
+        """
+        Returns what the checks of the commands depend on: the roles of the
+        author used by the checks, the permissions of the author and ownership
+        """
+        guild = GuildWrapper.get(ctx.guild)
+        roles_id = set()
+        for qualifiers in self.checks_qualifiers:
+            roles_id |= guild.get_roles_id(*qualifiers)
+        author_roles_id = roles_id.intersection(role.id for role in ctx.author.roles)
+        return (
+            ctx.guild.id,
+            frozenset(author_roles_id),
+            ctx.channel.permissions_for(ctx.author).value,
+            await self.bot.is_owner(ctx.author),
+        )
 
     @hybrid_command(name="help")
     @guild_only()
@@ -24,20 +75,25 @@ class Help(Cog):
         command : str, optional
             Nom de la commande dont on veut afficher l'aide.
         """
+        self._refresh()
         if command is not None:
             await self.help_command(ctx, command)
             return
 
-        sorted_commands = sorted(
-            await self._filtered_commands(ctx), key=attrgetter("name")
-        )
-        max_size = max(len(command.name) for command in sorted_commands)
+        key = await self._list_key(ctx)
+        if (content := self.lists.get(key)) is None:
+            sorted_commands = sorted(
+                await self._filtered_commands(ctx), key=attrgetter("name")
+            )
+            max_size = max(len(command.name) for command in sorted_commands)
 
-        content = ""
-        for command in sorted_commands:
-            content += f"`/{command.name:<{max_size+1}}` {command.short_doc}\n"
+            content = ""
+            for command in sorted_commands:
+                content += f"`/{command.name:<{max_size+1}}` {command.short_doc}\n"
+
+            content += "\nPour l'aide sur une commande, tapez `/help <commande>`."
+            self.lists.set(key, content)
 
-        content += "\nPour l'aide sur une commande, tapez `/help <commande>`."
         embed = discord.Embed(
             title=f"Liste des commandes du serveur {ctx.guild.name}",
             description=content,
@@ -49,12 +105,12 @@ class Help(Cog):
         """
         Shows help for a specific command.
         """
-        command = self.bot.get_command(command_name)
-        embed = discord.Embed(
-            title=f"Commande `/{command_name}`",
-            description=command.help,
-            color=0xEE22EE,
-        )
+        command_name = command_name.strip().lstrip("/")
+        if (embed := self.commands_help.get(command_name)) is None:
+            await ctx.reply(
+                f"La commande `/{command_name}` n'existe pas.", ephemeral=True
+            )
+            return
         await ctx.reply(embed=embed, ephemeral=True)
 
     async def _filtered_commands(self, ctx) -> list:
@@ -68,6 +124,7 @@ class Help(Cog):
             except CommandError:
                 return False
 
+        # Sequential: can_run sets ctx.command while the checks run
         return [c for c in self.bot.commands if await can_run(c)]
 
 
@@ -1,12 +1,56 @@
-from collections import defaultdict
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from urllib.parse import parse_qs, urlparse
 
 import discord
 import youtube_dl
 from discord.ext.commands import Cog, hybrid_command, guild_only, check
 
+from mp2i import CONFIG
 from mp2i.utils import youtube
 
-ytdl = youtube_dl.YoutubeDL()
+logger = logging.getLogger(__name__)
+
+STREAM_EXPIRY_MARGIN = 120  # Seconds before expiration when a url is extracted again
+STREAM_DEFAULT_LIFETIME = 3 * 3600  # Seconds, when the url gives no expiration
+BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1"
+
+_music_config = CONFIG.get("music") or {}
+# "opus" sends Opus streams as they are, "pcm" transcodes all streams
+PLAYBACK = _music_config.get("playback", "opus")
+VOLUME = _music_config.get("volume", 1.0)
+PLAYLIST_SIZE = _music_config.get("playlist_size", 100)
+PLAYLIST_WORKERS = _music_config.get("playlist_workers", 4)  # Concurrent extractions
+
+
+async def audio_source(
+    stream_url: str,
+    codec: Optional[str] = None,
+    playback: str = PLAYBACK,
+    volume: float = VOLUME,
+    before_options: str = BEFORE_OPTIONS,
+) -> discord.AudioSource:
+    """
+    Returns the source playing the stream. In opus playback, Opus streams are
+    copied by FFmpeg without decoding. Other streams, and all streams in pcm
+    playback, are decoded to apply the volume and encoded by the bot, which
+    costs less CPU than encoding them with FFmpeg (see benchmarks/playback.py).
+    """
+    if playback == "opus" and codec is None:  # Codec given by ffprobe
+        codec, _ = await discord.FFmpegOpusAudio.probe(stream_url)
+    if playback == "opus" and codec == "opus":
+        return discord.FFmpegOpusAudio(
+            stream_url, codec=codec, before_options=before_options, options="-vn"
+        )
+    return discord.PCMVolumeTransformer(
+        discord.FFmpegPCMAudio(
+            stream_url, before_options=before_options, options="-vn"
+        ),
+        volume=volume,
+    )
 
 
 def is_in_voice_channel(ctx):
@@ -21,11 +65,98 @@ class Video:
     """
 
     def __init__(self, name: str, url: str):
-        video = ytdl.extract_info(url, download=False)
-        video_format = video["formats"][0]
         self.url = url
         self.name = name
-        self.stream_url = video_format["url"]
+        self.stream_url: Optional[str] = None
+        self.codec: Optional[str] = None
+        self.expires_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def expired(self) -> bool:
+        return time.time() > self.expires_at - STREAM_EXPIRY_MARGIN
+
+    def resolve(self) -> "asyncio.Task[None]":
+        """
+        Extracts the stream url, again if it expired. Concurrent calls share
+        the same extraction.
+        """
+        if self._task is None or (self._task.done() and self.expired()):
+            self._task = asyncio.create_task(self._extract())
+            self._task.add_done_callback(self._log_error)
+        return self._task
+
+    def _log_error(self, task: asyncio.Task) -> None:
+        # Retrieves the error of prefetches which nobody awaits
+        if not task.cancelled() and (err := task.exception()) is not None:
+            logger.warning(f"Can't extract stream url of {self.url}: {err}")
+
+    async def _extract(self) -> None:
+        audio = await youtube.extract_audio(self.url)
+        self.stream_url, self.codec = audio["url"], audio["codec"]
+        # Stream urls of YouTube give their expiration in their query string
+        query = parse_qs(urlparse(self.stream_url).query)
+        try:
+            self.expires_at = float(query["expire"][0])
+        except (KeyError, ValueError):
+            self.expires_at = time.time() + STREAM_DEFAULT_LIFETIME
+
+
+class GuildPlayer:
+    """
+    Plays the queue of a guild in its voice channel. The stream url of the
+    next video is extracted while the current one plays, and the transition
+    to the next video is made in the event loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: Deque[Video] = deque()
+        self.current: Optional[Video] = None
+        self.voice_client: Optional[discord.VoiceClient] = None
+
+    async def add(self, voice_client: discord.VoiceClient, video: Video) -> bool:
+        """
+        Plays the video or queues it if a video is playing.
+        Returns True if the video is queued.
+        """
+        self.voice_client = voice_client
+        self.queue.append(video)
+        if self.current is None:
+            await self.play_next()
+            return False
+        self._prefetch()
+        return True
+
+    def _prefetch(self) -> None:
+        if self.queue:
+            self.queue[0].resolve()
+
+    async def play_next(self) -> None:
+        """
+        Plays the first playable video of the queue
+        """
+        self.current = None
+        while self.queue and self.voice_client and self.voice_client.is_connected():
+            video = self.current = self.queue.popleft()
+            try:
+                await video.resolve()
+                source = await audio_source(video.stream_url, video.codec)
+                self.voice_client.play(source, after=self._after)
+                break
+            except Exception as err:
+                logger.warning(f"Can't play {video.url}: {err}")
+                self.current = None
+        self._prefetch()
+
+    def _after(self, error: Optional[Exception]) -> None:
+        # Called from the audio thread, the next video is played from the loop
+        if error is not None:
+            logger.error(f"Player error: {error}")
+        asyncio.run_coroutine_threadsafe(self.play_next(), self.loop)
+
+    def clear(self) -> None:
+        self.queue.clear()
+        self.current = None
 
 
 class Music(Cog):
@@ -35,56 +166,103 @@ class Music(Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.musics = defaultdict(list)
+        self.players: Dict[int, GuildPlayer] = {}
+
+    def get_player(self, guild: discord.Guild) -> GuildPlayer:
+        if (player := self.players.get(guild.id)) is None:
+            player = self.players[guild.id] = GuildPlayer(self.bot.loop)
+        return player
+
+    async def cog_unload(self) -> None:
+        logger.info(f"YouTube searches: {youtube.stats()}")
 
     @hybrid_command(name="play", aliases=["p"])
     @guild_only()
     async def play(self, ctx, *, query: str) -> None:
         """
-        Joue la musique correspondante à la recherche.
+        Joue la musique correspondante à la recherche ou une playlist YouTube.
 
         Parameters
         ----------
         query : str
-            Mots clés de la musique.
+            Mots clés de la musique ou lien d'une playlist.
         """
-        voice_client = ctx.voice_client
-        try:
-            v_infos = next(youtube.search(query, n=1))
-        except StopIteration:
+        if not ctx.author.voice:
+            await ctx.send("Vous n'êtes pas connecté à un salon vocal")
+            return
+        if youtube.is_playlist_url(query):
+            await self.play_playlist(ctx, query)
+            return
+        if not (videos := await youtube.search(query, n=1)):
             await ctx.send("Aucune musique n'a été trouvée.")
             return
 
-        if voice_client and voice_client.is_playing():
-            video = Video(**v_infos)
-            self.musics[ctx.guild].append(video)
+        voice_client = ctx.voice_client
+        if not voice_client:
+            voice_client = await ctx.author.voice.channel.connect()
+        video = Video(**videos[0])
+        if await self.get_player(ctx.guild).add(voice_client, video):
             await ctx.send(
                 f"Musique ajoutée à la file d'attente: **{video.name}**\n"
                 f"{video.url}"
             )
-        elif ctx.author.voice:
-            if not voice_client:
-                voice_client = await ctx.author.voice.channel.connect()
-            video = Video(**v_infos)
-            self.play_song(voice_client, self.musics[ctx.guild], video)
-            await ctx.send(f"Musique en cours: **{video.name}** \n{video.url}")
         else:
-            await ctx.send("Vous n'êtes pas connecté à un salon vocal")
+            await ctx.send(f"Musique en cours: **{video.name}** \n{video.url}")
 
-    def play_song(self, voice_client, queue: list, video: Video) -> None:
-        source = discord.PCMVolumeTransformer(
-            discord.FFmpegPCMAudio(
-                source=video.stream_url,
-                before_options="-reconnect 1 -reconnect_streamed 1",
-            )
+    async def play_playlist(self, ctx, url: str) -> None:
+        """
+        Extracts the streams of the playlist concurrently and queues the videos
+        in order, so that the first one plays without waiting for the others.
+        """
+        await ctx.defer()
+        try:
+            playlist = await youtube.playlist(url, PLAYLIST_SIZE)
+        except youtube_dl.utils.DownloadError as err:
+            logger.warning(f"Can't list playlist {url}: {err}")
+            playlist = {"videos": []}
+        if not playlist["videos"]:
+            await ctx.send("Aucune musique n'a été trouvée.")
+            return
+
+        voice_client = ctx.voice_client
+        if not voice_client:
+            voice_client = await ctx.author.voice.channel.connect()
+        player = self.get_player(ctx.guild)
+        await ctx.send(
+            f"Import de la playlist **{playlist['name']}** "
+            f"({len(playlist['videos'])} musiques)..."
         )
 
-        def next_song(_):
-            if len(queue) > 0:
-                new_song = queue.pop(0)
-                self.play_song(voice_client, queue, new_song)
+        videos = [Video(**infos) for infos in playlist["videos"]]
+        # Whether the stream of each video was extracted, set by the workers
+        extracted = [asyncio.get_running_loop().create_future() for _ in videos]
+        pending = iter(enumerate(videos))
+
+        async def worker() -> None:
+            for i, video in pending:  # Shared by the workers, in playlist order
+                try:
+                    await video.resolve()
+                except Exception:
+                    extracted[i].set_result(False)  # Logged by the video
+                else:
+                    extracted[i].set_result(True)
 
-        voice_client.play(source, after=next_song)
+        workers = [asyncio.create_task(worker()) for _ in range(PLAYLIST_WORKERS)]
+        added = 0
+        try:
+            # Videos are queued in playlist order, the first one plays as soon as
+            # it is extracted while the workers extract the next ones
+            for video, done in zip(videos, extracted):
+                if not await done:
+                    continue
+                if not voice_client.is_connected():
+                    break
+                await player.add(voice_client, video)
+                added += 1
+        finally:
+            for task in workers:
+                task.cancel()
+        await ctx.send(f"{added} musiques ajoutées à la file d'attente.")
 
     @hybrid_command()
     @guild_only()
@@ -93,9 +271,10 @@ class Music(Cog):
         """
         Passer à la musique suivante, si disponible.
         """
+        player = self.get_player(ctx.guild)
         ctx.voice_client.stop()
-        if len(self.musics[ctx.guild]) > 0:
-            video = self.musics[ctx.guild][0]
+        if player.queue:
+            video = player.queue[0]
             await ctx.send(f"Musique en cours: **{video.name}** \n{video.url}")
         else:
             await ctx.send("Aucune musique en cours")
@@ -127,8 +306,9 @@ class Music(Cog):
         """
         Arrêter la musique et la file d'attente.
         """
+        if (player := self.players.pop(ctx.guild.id, None)) is not None:
+            player.clear()  # Before disconnecting, which ends the current video
         await ctx.voice_client.disconnect(force=True)
-        self.musics[ctx.guild] = []
 
 
 async def setup(bot) -> None:
@@ -12,10 +12,57 @@ from mp2i.wrappers.member import MemberWrapper
 from mp2i.wrappers.guild import GuildWrapper
 
 from mp2i.utils import email
+from mp2i.utils.reactions import reaction_router
 
 logger = logging.getLogger(__name__)
 
 
+class RoleSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"roles:select"):
+    """
+    The menu of the roles message. Its custom id is fixed, so the menu keeps
+    working after the bot restarts.
+    """
+
+    def __init__(self, guild: Optional[GuildWrapper] = None):
+        options = []
+        # Options are only needed to send the menu, not to handle a selection
+        if guild is not None:
+            for qualifier in guild.choiceable_roles:
+                emoji = guild.get_emoji_by_name(guild.config.roles[qualifier].emoji)
+                options.append(
+                    discord.SelectOption(label=qualifier, value=qualifier, emoji=emoji)
+                )
+        super().__init__(
+            discord.ui.Select(
+                custom_id="roles:select",
+                placeholder="Sélectionnez votre rôle",
+                options=options,
+            )
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match) -> "RoleSelect":
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        cog = interaction.client.get_cog("Roles")
+        guild = await GuildWrapper.fetch(interaction.guild)
+        member = await MemberWrapper.fetch(interaction.user)
+        qualifier = self.item.values[0]
+        await cog.select_role(guild, member, qualifier)
+        if qualifier == "Prof":
+            await interaction.followup.send(
+                "Une vérification vous a été envoyée en message privé.",
+                ephemeral=True,
+            )
+            await cog._add_prof_role(member, guild.get_role_by_qualifier("Prof"))
+        else:
+            await interaction.followup.send(
+                f"Vous avez désormais le rôle {qualifier}.", ephemeral=True
+            )
+
+
 class Roles(Cog):
     """
     Offers an interface to manage roles and send messages
@@ -25,18 +72,41 @@ class Roles(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self) -> None:
+        self.bot.add_dynamic_items(RoleSelect)
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(RoleSelect)
+
+    @Cog.listener("on_ready")
+    async def watch_roles_messages(self) -> None:
+        """
+        Routes reactions on the roles message of each guild to on_selection,
+        for messages sent before the roles menu.
+        """
+        for guild in self.bot.guilds:
+            guild = await GuildWrapper.fetch(guild)
+            if guild.exists() and guild.roles_message_id:
+                reaction_router.watch_message(
+                    guild.roles_message_id, "roles", self.on_selection
+                )
+
     @hybrid_command(name="roles", hidden=True)
     @is_owner()
     async def roles(self, ctx, message_id: Optional[str] = "") -> None:
         """
         Génère ou définit le message pour choisir ses rôles.
         """
-        guild = GuildWrapper(ctx.guild)
+        guild = await GuildWrapper.fetch(ctx.guild)
+        if guild.exists() and guild.roles_message_id:
+            reaction_router.unwatch_message(guild.roles_message_id)
         if message_id:
-            guild.roles_message_id = int(message_id)
+            await guild.update(roles_message_id=int(message_id))
             await ctx.reply(f"Le bot écoute désormais le message `{message_id}`")
         else:
-            guild.roles_message_id = await self._send_selection(guild, ctx.channel)
+            message_id = await self._send_selection(guild, ctx.channel)
+            await guild.update(roles_message_id=message_id)
+        reaction_router.watch_message(int(message_id), "roles", self.on_selection)
 
     async def _send_selection(
         self, guild: GuildWrapper, channel: discord.TextChannel
@@ -58,61 +128,62 @@ class Roles(Cog):
                 timestamp=datetime.now(),
             )
             embed.set_footer(text=self.bot.user.name)
-            message = await channel.send(embed=embed)
-
-        # Add reactions to the message
-        for role_cfg in guild.config.roles.values():
-            if not role_cfg.choice:
-                continue
-            if emoji := guild.get_emoji_by_name(role_cfg.emoji):
-                await message.add_reaction(emoji)
-            else:
-                logger.error(f"{role_cfg.emoji} emoji not found")
 
+        view = discord.ui.View(timeout=None)
+        view.add_item(RoleSelect(guild))
+        message = await channel.send(embed=embed, view=view)
         return message.id
 
-    @Cog.listener("on_raw_reaction_add")
-    async def on_selection(self, payload) -> None:
+    async def select_role(
+        self, guild: GuildWrapper, member: MemberWrapper, qualifier: str
+    ) -> None:
         """
-        Update role from the user selection.
+        Gives the chosen role and removes the other choiceable roles with a single
+        request. The Prof role is given later, by the verification.
         """
-        if not hasattr(payload, "guild_id") or payload.member.id == self.bot.user.id:
-            return  # Ignore DM and bot reaction
-
-        guild = GuildWrapper(self.bot.get_guild(payload.guild_id))
-        if guild.roles_message_id != payload.message_id:
-            return  # Ignore if it is not the good message
-
-        member = MemberWrapper(payload.member)
         if not member.exists():
             logger.warning(f"The user {member.name} was not a registered member")
-            member.register()
+            await member.register()
+
+        choiceable_ids = {guild.config.roles[q].id for q in guild.choiceable_roles}
+        roles = {
+            role
+            for role in member.roles
+            if role.id not in choiceable_ids and not role.is_default()
+        }
+        if qualifier != "Prof":
+            roles.add(guild.get_role_by_qualifier(qualifier))
+        # The role in database is the previous choice of the member
+        mpi_role = guild.get_role_by_qualifier("MPI")
+        if qualifier == "Intégré" and member.role == mpi_role:
+            roles.add(guild.get_role_by_qualifier("Ex MPI"))
+        roles.discard(None)  # Roles missing from the configuration or the guild
+
+        if roles != {role for role in member.roles if not role.is_default()}:
+            await member.edit(roles=list(roles))
+        await member.update(role=qualifier)
 
+    async def on_selection(self, payload) -> bool:
+        """
+        Update role from a reaction on a roles message sent before the roles menu,
+        reactions are routed here only for the roles message of the guild.
+        """
+        guild = await GuildWrapper.fetch(self.bot.get_guild(payload.guild_id))
+        for qualifier in guild.choiceable_roles:
+            if guild.config.roles[qualifier].emoji == payload.emoji.name:
+                break
+        else:
+            return False  # Not the emoji of a role
+
+        member = await MemberWrapper.fetch(payload.member)
+        await self.select_role(guild, member, qualifier)
+        # The reaction is removed to let the member choose again later
         channel = self.bot.get_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        mpi_role = guild.get_role_by_qualifier("MPI")
-        ex_mpi_role = guild.get_role_by_qualifier("Ex MPI")
-
-        for qualifier, role_cfg in guild.config.roles.items():
-            if not role_cfg.choice:
-                continue
-            role = guild.get_role(role_cfg.id)
-
-            if role_cfg.emoji == payload.emoji.name:
-                # Add the role
-                if qualifier == "Prof":
-                    prof_role = guild.get_role_by_qualifier("Prof")
-                    await self._add_prof_role(member, prof_role)
-                elif qualifier == "Intégré" and member.role == mpi_role:
-                    await member.add_roles(role, ex_mpi_role)
-                else:
-                    await member.add_roles(role)
-                member.update(role=qualifier)
-            else:
-                # Remove the role
-                if emoji := guild.get_emoji_by_name(role_cfg.emoji):
-                    await message.remove_reaction(emoji, member)
-                await member.remove_roles(role)
+        message = channel.get_partial_message(payload.message_id)
+        await message.remove_reaction(payload.emoji, member)
+        if qualifier == "Prof":
+            await self._add_prof_role(member, guild.get_role_by_qualifier("Prof"))
+        return True
 
     async def _add_prof_role(self, member: MemberWrapper, prof_role: discord.Role):
         """
@@ -140,7 +211,7 @@ class Roles(Cog):
             message = message.replace("(username)", member.name)
             message = message.replace("(verification_code)", verification_code)
 
-            if not email.send(receiver_email, message):
+            if not await email.send(receiver_email, message):
                 await member.send("Une erreur est survenue lors de l'envoi de l'email.")
                 return
             await member.send(
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 
 import discord
 from discord.ext.commands import Cog, hybrid_command, guild_only
@@ -8,10 +8,126 @@ from sqlalchemy import insert, select, delete
 
 from mp2i.utils import database
 from mp2i.models import SanctionModel
-from mp2i.utils.discord import has_any_role
+from mp2i.utils.discord import has_any_role, member_has_any_role
 
 logger = logging.getLogger(__name__)
 
+WARNLIST_PAGE_SIZE = 10
+# Longer reasons are cut so that a full page fits in an embed description
+WARNLIST_REASON_LENGTH = 250
+
+
+async def warnlist_page(
+    guild: discord.Guild,
+    member_id: int = 0,
+    direction: str = "next",
+    cursor: Optional[int] = None,
+) -> Tuple[discord.Embed, discord.ui.View]:
+    """
+    Returns a page of warns of the guild, or of a member if member_id is not 0.
+    Pages are sorted from the most recent warn, the next page starts after the
+    cursor and the previous one ends before it.
+    """
+    conditions = [SanctionModel.guild_id == guild.id, SanctionModel.type == "warn"]
+    if member_id:
+        conditions.append(SanctionModel.to_id == member_id)
+
+    request = select(SanctionModel).where(*conditions)
+    if direction == "next":
+        if cursor is not None:
+            request = request.where(SanctionModel.id < cursor)
+        request = request.order_by(SanctionModel.id.desc())
+    else:
+        request = request.where(SanctionModel.id > cursor)
+        request = request.order_by(SanctionModel.id)
+    # One more row tells whether there is another page in this direction
+    result = await database.execute_async(request.limit(WARNLIST_PAGE_SIZE + 1))
+    sanctions = result.scalars().all()
+    if not sanctions and cursor is not None:
+        # Warns of the page have been removed meanwhile
+        return await warnlist_page(guild, member_id)
+
+    more = len(sanctions) > WARNLIST_PAGE_SIZE
+    sanctions = sanctions[:WARNLIST_PAGE_SIZE]
+    if direction == "next":
+        has_previous, has_next = cursor is not None, more
+    else:
+        sanctions.reverse()
+        has_previous, has_next = more, True
+
+    content = "" if sanctions else "Aucun avertissement.\n"
+    for sanction in sanctions:
+        # Mentions are resolved by Discord, members who left are still displayed
+        content += f"**{sanction.id}** ━ Le {sanction.date:%d/%m/%Y à %H:%M}\n"
+        if not member_id:
+            content += f"> **Membre :** <@{sanction.to_id}>\n"
+        content += f"> **Modérateur :** <@{sanction.by_id}>\n"
+        if reason := sanction.reason:
+            if len(reason) > WARNLIST_REASON_LENGTH:
+                reason = reason[: WARNLIST_REASON_LENGTH - 1] + "…"
+            content += f"> **Raison :** {reason}\n"
+        content += "\n"
+
+    if not member_id:
+        title = "Liste des avertissements du serveur"
+    elif member := guild.get_member(member_id):
+        title = f"Liste des avertissements de {member.name}"
+    else:
+        title = f"Liste des avertissements de {member_id}"
+    embed = discord.Embed(
+        title=title, description=content, colour=0xFF00FF, timestamp=datetime.now()
+    )
+
+    first = sanctions[0].id if sanctions else 0
+    last = sanctions[-1].id if sanctions else 0
+    view = discord.ui.View(timeout=None)
+    view.add_item(WarnlistButton("previous", member_id, first, not has_previous))
+    view.add_item(WarnlistButton("next", member_id, last, not has_next))
+    return embed, view
+
+
+class WarnlistButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"warnlist:(?P<direction>next|previous):(?P<member>\d+):(?P<cursor>\d+)",
+):
+    """
+    A button to browse /warnlist pages. The page to display is stored in its
+    custom id, so buttons keep working after the bot restarts.
+    """
+
+    def __init__(
+        self, direction: str, member_id: int, cursor: int, disabled: bool = False
+    ):
+        super().__init__(
+            discord.ui.Button(
+                label="Précédent" if direction == "previous" else "Suivant",
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"warnlist:{direction}:{member_id}:{cursor}",
+                disabled=disabled,
+            )
+        )
+        self.direction = direction
+        self.member_id = member_id
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match) -> "WarnlistButton":
+        return cls(match["direction"], int(match["member"]), int(match["cursor"]))
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if member_has_any_role(interaction.user, "Modérateur", "Administrateur"):
+            return True
+        await interaction.response.send_message(
+            "Vous n'avez pas la permission d'utiliser cette commande.", ephemeral=True
+        )
+        return False
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        embed, view = await warnlist_page(
+            interaction.guild, self.member_id, self.direction, self.cursor
+        )
+        await interaction.response.edit_message(embed=embed, view=view)
+
 
 class Sanction(Cog):
     """
@@ -21,6 +137,13 @@ class Sanction(Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self) -> None:
+        # Buttons of pages sent before a restart are matched by their custom id
+        self.bot.add_dynamic_items(WarnlistButton)
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(WarnlistButton)
+
     @hybrid_command(name="warn")
     @guild_only()
     @has_any_role("Modérateur", "Administrateur")
@@ -40,7 +163,7 @@ class Sanction(Cog):
         reason : Optional[str]
             La raison de l'avertissement.
         """
-        database.execute(
+        await database.execute_async(
             insert(SanctionModel).values(
                 by_id=ctx.author.id,
                 to_id=member.id,
@@ -81,38 +204,9 @@ class Sanction(Cog):
         member : Optional[discord.Member]
             Le membre dont on veut lister les sanctions.
         """
-        if member:
-            request = select(SanctionModel).where(
-                SanctionModel.to_id == member.id,
-                SanctionModel.guild_id == ctx.guild.id,
-                SanctionModel.type == "warn",
-            )
-            title = f"Liste des avertissements de {member.name}"
-        else:
-            request = select(SanctionModel).where(
-                SanctionModel.guild_id == ctx.guild.id, SanctionModel.type == "warn"
-            )
-            title = "Liste des avertissements du serveur"
-
-        sanctions = database.execute(request).scalars().all()
-        content = f"**Nombre d'avertissements :** {len(sanctions)}\n\n"
-
-        for sanction in sanctions:
-            content += f"**{sanction.id}** ━ Le {sanction.date:%d/%m/%Y à %H:%M}\n"
-            if not member:
-                to = ctx.guild.get_member(sanction.to_id)
-                content += f"> **Membre :** {to.mention}\n"
-
-            by = ctx.guild.get_member(sanction.by_id)
-            content += f"> **Modérateur :** {by.mention}\n"
-            if sanction.reason:
-                content += f"> **Raison :** {sanction.reason}\n"
-            content += "\n"
-
-        embed = discord.Embed(
-            title=title, description=content, colour=0xFF00FF, timestamp=datetime.now()
-        )
-        await ctx.send(embed=embed)
+        member_id = member.id if member else 0
+        embed, view = await warnlist_page(ctx.guild, member_id)
+        await ctx.send(embed=embed, view=view)
 
     @hybrid_command(name="unwarn")
     @guild_only()
@@ -126,7 +220,9 @@ class Sanction(Cog):
         id : int
             L'identifiant de l'avertissement à supprimer.
         """
-        database.execute(delete(SanctionModel).where(SanctionModel.id == id))
+        await database.execute_async(
+            delete(SanctionModel).where(SanctionModel.id == id)
+        )
         await ctx.send(f"L'avertissement {id} a été supprimé.")
 
 
@@ -12,8 +12,9 @@ from discord.app_commands import autocomplete, Choice, choices
 
 from mp2i import STATIC_DIR
 from mp2i.wrappers.member import MemberWrapper
-from mp2i.wrappers.guild import GuildWrapper
+from mp2i.wrappers.guild import GuildWrapper, SCHOOL_COLUMNS
 from mp2i.utils.discord import defer, has_any_role
+from mp2i.utils.search import SearchIndex
 
 SCHOOL_REGEX = re.compile(r"^.+[|@] *(?P<prepa>.*)$")
 
@@ -27,10 +28,17 @@ class School(Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        with open(STATIC_DIR / "text/cpge.txt") as f:
-            self.high_schools = f.read().splitlines()
-        with open(STATIC_DIR / "text/engineering.txt") as f:
-            self.engineering_schools = f.read().splitlines()
+        self.high_schools = SearchIndex([])
+        self.engineering_schools = SearchIndex([])
+
+    async def cog_load(self) -> None:
+        """
+        Builds the search indexes of schools once, used by the autocompletion.
+        """
+        with open(STATIC_DIR / "text/cpge.txt", encoding="utf-8") as f:
+            self.high_schools = SearchIndex(f.read().splitlines())
+        with open(STATIC_DIR / "text/engineering.txt", encoding="utf-8") as f:
+            self.engineering_schools = SearchIndex(f.read().splitlines())
 
     async def autocomplete_school(
         self, interaction: discord.Interaction, current: str
@@ -38,18 +46,14 @@ class School(Cog):
         """
         Return a list of school corresponding to current text.
         """
-        await interaction.response.defer()  # Defer the response to avoid timeout
-
         type = interaction.namespace.type
         if type == "cpge":
-            schools = self.high_schools
+            schools = self.high_schools.search(current)
         elif type == "engineering":
-            schools = self.engineering_schools
+            schools = self.engineering_schools.search(current)
         else:
             schools = []
-
-        filtered_schools = [s for s in schools if current.lower().strip() in s.lower()]
-        return [Choice(name=s, value=s) for s in filtered_schools[:20]]
+        return [Choice(name=s, value=s) for s in schools]
 
     @hybrid_command(name="school")
     @guild_only()
@@ -85,19 +89,19 @@ class School(Cog):
         if type == "cpge":
             if school == "Aucun":
                 response = f"{member.name} ne fait plus partie d'une CPGE."
-                member.high_school = None
+                await member.update(high_school=None)
             elif school in self.high_schools:
                 response = f"{member.name} fait maintenant partie du lycée {school}."
-                member.high_school = school
+                await member.update(high_school=school)
             else:
                 response = f"Le lycée {school} n'existe pas."
         elif type == "engineering":
             if school == "Aucun":
                 response = f"{member.name} ne fait plus partie d'aucune école."
-                member.engineering_school = None
+                await member.update(engineering_school=None)
             elif school in self.engineering_schools:
                 response = f"{member.name} fait maintenant partie de l'école {school}."
-                member.engineering_school = school
+                await member.update(engineering_school=school)
             else:
                 response = f"L'école {school} n'existe pas"
         else:
@@ -125,13 +129,13 @@ class School(Cog):
         """
         member = MemberWrapper(ctx.author)
         if user is None or user == ctx.author:
-            member.generation = year
+            await member.update(generation=year)
             await ctx.reply(
                 f"Vous faites maintenant partie de la génération {year} !",
                 ephemeral=True,
             )
         elif member.guild_permissions.manage_roles:
-            member.generation = year
+            await member.update(generation=year)
             await ctx.reply(
                 f"{user.mention} fait maintenant partie de la génération {year} !",
                 ephemeral=True,
@@ -153,22 +157,24 @@ class School(Cog):
         """
         Affiche les étudiants d'une école donnée.
         """
-        guild = GuildWrapper(ctx.guild)
-        members = [m for m in map(MemberWrapper, guild.members) if m.exists()]
+        guild = GuildWrapper.get(ctx.guild)
         if type == "cpge":
-            students = [m for m in members if m.high_school == school]
             referent_role = guild.get_role_by_qualifier("Référent CPGE")
         elif type == "engineering":
-            students = [m for m in members if m.engineering_school == school]
             referent_role = guild.get_role_by_qualifier("Référent École")
         else:
             await ctx.reply("Précisez un type entre `cpge` ou `engineering`.")
             return
 
+        students = await guild.get_students(type, school)
         if not students:
             await ctx.reply(f"{school} n'a aucun étudiant sur {guild.name}.")
             return
-        referents = [m for m in students if m.get_role(referent_role.id)]
+        # Role members come from the gateway cache, no query is needed
+        referents_id = set()
+        if referent_role is not None:
+            referents_id = {m.id for m in referent_role.members}
+        referents = [m for m in students if m.id in referents_id]
 
         content = f"Nombre d'étudiants : {len(students)}\n"
         for referent in referents:
@@ -199,7 +205,7 @@ class School(Cog):
         """
         Liste les étudiants référents du serveur.
         """
-        guild = GuildWrapper(ctx.guild)
+        guild = GuildWrapper.get(ctx.guild)
         referent_role = guild.get_role_by_qualifier("Référent CPGE")
 
         if type == "engineering":
@@ -209,15 +215,18 @@ class School(Cog):
         if referent_role is None:
             raise ValueError("Corresponding referent role is not in bot config file.")
 
+        # Only members of the role are considered, with their schools in one query
+        if type in SCHOOL_COLUMNS:
+            members_id = (m.id for m in referent_role.members)
+            schools = await guild.get_schools(type, members_id)
+        else:
+            schools = {}
+
         referents = []
-        for member in map(MemberWrapper, guild.members):
-            if not member.get_role(referent_role.id):
-                continue
-            if type == "cpge" and member.exists() and member.high_school is not None:
-                referents.append((member, member.high_school))
-            elif type == "engineering" and member.exists() and member.engineering_school is not None:
-                referents.append((member, member.engineering_school))
-            elif match := SCHOOL_REGEX.match(member.nick):
+        for member in referent_role.members:
+            if (school := schools.get(member.id)) is not None:
+                referents.append((member, school))
+            elif member.nick and (match := SCHOOL_REGEX.match(member.nick)):
                 referents.append((member, match.group(1)))
 
         content = ""
@@ -1,16 +1,205 @@
 from datetime import datetime
+from typing import Tuple
 
 import discord
 from discord.ext.commands import Cog, hybrid_command, is_owner, guild_only
 from discord.app_commands import Choice, choices
-from sqlalchemy import insert, select, update
+from sqlalchemy import case, delete, func, insert, select, update
 
 from mp2i import STATIC_DIR
-from mp2i.models import SuggestionModel
+from mp2i.models import SuggestionModel, SuggestionVoteModel
 from mp2i.utils import database
+from mp2i.utils.cache import LRUCache
+from mp2i.utils.messages import message_cache
+from mp2i.utils.reactions import reaction_router
 from mp2i.wrappers.guild import GuildWrapper
 from mp2i.utils.discord import defer
 
+# Value of a vote given by each button
+VOTES = {"for": 1, "against": -1}
+# State of a suggestion closed by each administrator button
+CLOSING_STATES = {"accept": "accepted", "decline": "declined", "close": "closed"}
+# Label, emoji, style and row of each button
+BUTTONS = {
+    "for": ("Pour", "✅", discord.ButtonStyle.success, 0),
+    "against": ("Contre", "❌", discord.ButtonStyle.danger, 0),
+    "accept": ("Accepter", None, discord.ButtonStyle.secondary, 1),
+    "decline": ("Refuser", None, discord.ButtonStyle.secondary, 1),
+    "close": ("Fermer", "🔒", discord.ButtonStyle.secondary, 1),
+}
+# State of a suggestion sent before the buttons, closed by each reaction
+LEGACY_CLOSING_STATES = {"✅": "accepted", "❌": "declined", "🔒": "closed"}
+# Colour, title and note of the message sent when a suggestion is closed
+RESULTS = {
+    "accepted": (
+        0x77B255,
+        "Suggestion acceptée",
+        "\n_**Note**: Il faut parfois attendre plusieurs jours avant qu'elle soit "
+        "effective_",
+    ),
+    "declined": (0xDD2E44, "Suggestion refusée", ""),
+    "closed": (0xA9A6A7, "Suggestion fermée", ""),
+}
+# Colour and title of the list of suggestions in each state
+LISTS = {
+    "open": (0xA9A6A7, "Suggestions en cours"),
+    "accepted": (0x77B255, "Suggestions acceptées"),
+    "declined": (0xDD2E44, "Suggestions refusées"),
+    "closed": (0xA9A6A7, "Suggestions fermées"),
+}
+
+
+async def get_tally(suggestion_id: int) -> Tuple[int, int]:
+    """
+    Returns the number of votes for and against a suggestion.
+    """
+    vote = SuggestionVoteModel.vote
+    result = await database.execute_async(
+        select(
+            func.coalesce(func.sum(case((vote > 0, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((vote < 0, 1), else_=0)), 0),
+        ).where(SuggestionVoteModel.suggestion_id == suggestion_id)
+    )
+    return tuple(result.one())
+
+
+async def send_result(
+    channel: discord.TextChannel,
+    suggestion: SuggestionModel,
+    state: str,
+    tally: Tuple[int, int],
+) -> None:
+    """
+    Closes the suggestion in the database and sends its result in the channel.
+    """
+    await database.execute_async(
+        update(SuggestionModel)
+        .where(SuggestionModel.id == suggestion.id)
+        .values(state=state, date=datetime.now())
+    )
+    citation = (
+        "\n> ".join(suggestion.description.split("\n"))
+        + f"\n\n✅: {tally[0]} vote(s), ❌: {tally[1]} vote(s)"
+    )
+    colour, title, note = RESULTS[state]
+    embed = discord.Embed(colour=colour, title=title, description=f"> {citation}{note}")
+    file = discord.File(STATIC_DIR / "img/alert.png")
+    embed.set_thumbnail(url="attachment://alert.png")
+    author = channel.guild.get_member(suggestion.author_id)
+    embed.set_author(name=author.name if author else "Utilisateur inconnu")
+    await channel.send(file=file, embed=embed)
+
+
+def votes_view(suggestion_id: int, tally: Tuple[int, int] = (0, 0)) -> discord.ui.View:
+    """
+    Returns the buttons of a suggestion, with the number of votes on them.
+    """
+    view = discord.ui.View(timeout=None)
+    for action in BUTTONS:
+        view.add_item(SuggestionButton(action, suggestion_id, tally))
+    return view
+
+
+class SuggestionButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"suggestion:(?P<action>for|against|accept|decline|close):(?P<id>\d+)",
+):
+    """
+    A button to vote for a suggestion, or to close it for administrators.
+    The suggestion is stored in its custom id, so buttons keep working after
+    the bot restarts.
+    """
+
+    def __init__(
+        self, action: str, suggestion_id: int, tally: Tuple[int, int] = (0, 0)
+    ):
+        label, emoji, style, row = BUTTONS[action]
+        if action in VOTES:
+            label += f" ({tally[0] if action == 'for' else tally[1]})"
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                emoji=emoji,
+                style=style,
+                row=row,
+                custom_id=f"suggestion:{action}:{suggestion_id}",
+            )
+        )
+        self.action = action
+        self.suggestion_id = suggestion_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match) -> "SuggestionButton":
+        return cls(match["action"], int(match["id"]))
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        if self.action in VOTES:
+            await self.vote(interaction)
+        else:
+            await self.close(interaction)
+
+    async def vote(self, interaction: discord.Interaction) -> None:
+        """
+        Saves the vote of the member, voting twice the same way withdraws it.
+        """
+        value = VOTES[self.action]
+        where = (
+            SuggestionVoteModel.suggestion_id == self.suggestion_id,
+            SuggestionVoteModel.member_id == interaction.user.id,
+        )
+        result = await database.execute_async(
+            select(SuggestionVoteModel.vote).where(*where)
+        )
+        if result is not None and result.scalar() == value:
+            await database.execute_async(delete(SuggestionVoteModel).where(*where))
+        else:
+            # The primary key allows a single vote by member, the previous one
+            # is replaced in the same transaction
+            await database.execute_transaction(
+                delete(SuggestionVoteModel).where(*where),
+                insert(SuggestionVoteModel).values(
+                    suggestion_id=self.suggestion_id,
+                    member_id=interaction.user.id,
+                    vote=value,
+                ),
+            )
+        tally = await get_tally(self.suggestion_id)
+        await interaction.response.edit_message(
+            view=votes_view(self.suggestion_id, tally)
+        )
+
+    async def close(self, interaction: discord.Interaction) -> None:
+        """
+        Closes the suggestion and sends the result, for administrators only.
+        """
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message(
+                "Seul un administrateur peut fermer une suggestion.", ephemeral=True
+            )
+            return
+        result = await database.execute_async(
+            select(SuggestionModel).where(SuggestionModel.id == self.suggestion_id)
+        )
+        suggestion = result.scalar_one_or_none() if result is not None else None
+        if suggestion is None or suggestion.state != "open":
+            await interaction.response.send_message(
+                "Cette suggestion est déjà fermée.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer()
+        tally = await get_tally(suggestion.id)
+        await send_result(
+            interaction.channel, suggestion, CLOSING_STATES[self.action], tally
+        )
+        try:
+            message = interaction.channel.get_partial_message(suggestion.message_id)
+            await message.delete()
+        except discord.errors.NotFound:
+            pass
+        await interaction.message.delete()
+
+
 class Suggestion(Cog):
     """
     Offers commands to allow members to propose suggestions and interact with them
@@ -20,6 +209,20 @@ class Suggestion(Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.pins = LRUCache(maxsize=1024)  # Pins added by message id
+
+    async def cog_load(self) -> None:
+        # Buttons of suggestions sent before a restart are matched by their custom id
+        self.bot.add_dynamic_items(SuggestionButton)
+        reaction_router.watch_emoji("📌", "pins", self.add_pin)
+        for emoji in LEGACY_CLOSING_STATES:
+            reaction_router.watch_emoji(emoji, "legacy suggestions", self.close_legacy)
+
+    async def cog_unload(self) -> None:
+        self.bot.remove_dynamic_items(SuggestionButton)
+        reaction_router.unwatch_emoji("📌")
+        for emoji in LEGACY_CLOSING_STATES:
+            reaction_router.unwatch_emoji(emoji)
 
     @hybrid_command(name="suggestionsrules")
     @is_owner()
@@ -27,7 +230,7 @@ class Suggestion(Cog):
         """
         Affiche le fonctionnement des suggestions.
         """
-        guild = GuildWrapper(ctx.guild)
+        guild = GuildWrapper.get(ctx.guild)
         if ctx.channel != guild.suggestion_channel:
             return
 
@@ -46,21 +249,13 @@ class Suggestion(Cog):
     @Cog.listener("on_message")
     async def make_suggestion(self, msg) -> None:
         """
-        Add reactions to a suggestion message and create a thread.
+        Create a thread and send the voting buttons of a suggestion message.
         """
         if msg.author.bot or isinstance(msg.channel, discord.DMChannel):
             return
-        if msg.channel != GuildWrapper(msg.channel.guild).suggestion_channel:
+        if msg.channel != GuildWrapper.get(msg.channel.guild).suggestion_channel:
             return
-        try:
-            await msg.add_reaction("✅")
-            await msg.add_reaction("❌")
-            await msg.channel.create_thread(
-                name=f"Suggestion de {msg.author.name}", message=msg
-            )
-        except discord.errors.NotFound:
-            pass
-        database.execute(
+        result = await database.execute_returning(
             insert(SuggestionModel).values(
                 author_id=msg.author.id,
                 date=datetime.now(),
@@ -68,72 +263,89 @@ class Suggestion(Cog):
                 description=msg.content,
                 message_id=msg.id,
                 state="open",
-            )
+            ),
+            select(SuggestionModel.id).where(SuggestionModel.message_id == msg.id),
         )
+        if result is None:
+            return
+        try:
+            await msg.channel.create_thread(
+                name=f"Suggestion de {msg.author.name}", message=msg
+            )
+            await msg.reply(
+                "Votez pour cette suggestion :",
+                view=votes_view(result.scalar_one()),
+                mention_author=False,
+            )
+        except discord.errors.NotFound:
+            pass
 
-    @Cog.listener("on_raw_reaction_add")
-    async def close_suggestion(self, payload) -> None:
+    async def close_legacy(self, payload) -> bool:
         """
-        Send result to all users when an admin add a reaction.
+        Closes a suggestion sent before the buttons when an administrator
+        reacts to it, its votes are the reactions of the message.
         """
-        if payload.member.bot or str(payload.emoji) not in ("✅", "❌", "🔒"):
-            return
+        guild = GuildWrapper.get(self.bot.get_guild(payload.guild_id))
+        channel = guild.suggestion_channel
+        if channel is None or payload.channel_id != channel.id:
+            return False
+        if not payload.member.guild_permissions.administrator:
+            return False
         try:
-            channel = self.bot.get_channel(payload.channel_id)
-            suggestion = await channel.fetch_message(payload.message_id)
+            message = await message_cache.fetch(channel, payload.message_id)
         except discord.errors.NotFound:
-            return
-        if channel != GuildWrapper(channel.guild).suggestion_channel:
-            return
-        if not payload.member.guild_permissions.administrator:
-            return  # only administrator can close a suggestion
-        accept = discord.utils.get(suggestion.reactions, emoji="✅")
-        decline = discord.utils.get(suggestion.reactions, emoji="❌")
-        close = discord.utils.get(suggestion.reactions, emoji="🔒")
-        citation = (
-            "\n> ".join(suggestion.content.split("\n"))
-            + f"\n\n✅: {accept.count-1} vote(s), ❌: {decline.count-1} vote(s)"
-        ) 
-        accepted = str(payload.emoji) == accept.emoji
-        declined = str(payload.emoji) == decline.emoji
-        database.execute(
-            update(SuggestionModel)
-            .where(SuggestionModel.message_id == suggestion.id)
-            .values(
-                state="accepted" if accepted else "declined" if declined else "closed",
-                date=datetime.now()
+            return False
+        (accept, accept_me), (decline, decline_me) = map(message.reaction, "✅❌")
+        if not (accept_me and decline_me):
+            return False  # The bot reacted only to suggestions without buttons
+        result = await database.execute_async(
+            select(SuggestionModel).where(
+                SuggestionModel.message_id == message.id,
+                SuggestionModel.state == "open",
             )
         )
-        if accepted:
-            embed = discord.Embed(colour=0x77B255, title=f"Suggestion acceptée", description=f"> {citation}\n_**Note**: Il faut parfois attendre plusieurs jours avant qu'elle soit effective_")
-        elif declined:
-            embed = discord.Embed(colour=0xDD2E44, title=f"Suggestion refusée", description=f"> {citation}")
-        else:
-            embed = discord.Embed(colour=0xA9A6A7, title=f"Suggestion fermée", description=f"> {citation}")
-        file = discord.File(STATIC_DIR / "img/alert.png")
-        embed.set_thumbnail(url="attachment://alert.png")
-        embed.set_author(name=suggestion.author.name)
+        if result is None or (suggestion := result.scalar_one_or_none()) is None:
+            return False
 
-        await channel.send(file=file, embed=embed)
-        await suggestion.delete()
+        state = LEGACY_CLOSING_STATES[str(payload.emoji)]
+        # Reactions of the bot are not votes
+        await send_result(channel, suggestion, state, (accept - 1, decline - 1))
+        try:
+            await channel.get_partial_message(message.id).delete()
+        except discord.errors.NotFound:
+            pass
+        message_cache.remove(message.id)
+        return True
 
-    @Cog.listener("on_raw_reaction_add")
-    @guild_only()
-    async def add_pin(self, payload) -> None:
+    async def add_pin(self, payload) -> bool:
         """
         Add a pin to a message and send it to website channel when
         it reach the required number of pins reactions.
+        Pins are counted in memory, the message is read only when the count
+        is unknown or reaches the minimum.
         """
-        if str(payload.emoji) != "📌":
-            return
-
         channel = self.bot.get_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        pins = discord.utils.get(message.reactions, emoji="📌", me=False)
-        if pins is None or pins.count < self.MINIMUM_PINS:
-            return
+        if (pins_count := self.pins.get(payload.message_id)) is None:
+            # Unknown after a restart or an eviction, counted from the reactions
+            message = await message_cache.fetch(channel, payload.message_id)
+            count, me = message.reaction("📌")
+            pins_count = count - me
+        else:
+            pins_count += 1
+        self.pins.set(payload.message_id, pins_count)
+        if pins_count < self.MINIMUM_PINS:
+            return False
+
+        message = await message_cache.fetch(channel, payload.message_id)
+        count, me = message.reaction("📌")
+        if me:
+            return True  # Already sent, the count stays above the minimum
+        if count < self.MINIMUM_PINS:
+            # Some pins were removed, the message is checked again when it
+            # reaches the minimum
+            self.pins.set(payload.message_id, count)
+            return True
 
-        author = message.author
         embed = discord.Embed(
             colour=0x00FF00,
             title="Message épinglé",
@@ -142,14 +354,15 @@ class Suggestion(Cog):
             timestamp=datetime.now(),
         )
         embed.add_field(name="Lien du message", value=message.jump_url)
-        embed.set_author(name=author.name, icon_url=author.avatar.url)
+        embed.set_author(name=message.author_name, icon_url=message.author_avatar)
         embed.set_footer(text=self.bot.user.name)
         website_chan = self.bot.get_channel(
-            GuildWrapper(channel.guild).config.channels.website
+            GuildWrapper.get(channel.guild).config.channels.website
         )
         await website_chan.send(embed=embed)
         # Pour ne pas envoyer le message plusieurs fois
-        await message.add_reaction("📌")
+        await channel.get_partial_message(message.id).add_reaction("📌")
+        return True
     
     @hybrid_command(name="suggestions")
     @guild_only()
@@ -160,9 +373,13 @@ class Suggestion(Cog):
             Choice(name="Acceptées", value="accepted"),
             Choice(name="Refusées", value="declined"),
             Choice(name="Fermées", value="closed"),
-        ]
+        ],
+        sort=[
+            Choice(name="Plus récentes", value="date"),
+            Choice(name="Meilleur score", value="score"),
+        ],
     )
-    async def suggestions(self, ctx, state: str) -> None:
+    async def suggestions(self, ctx, state: str, sort: str = "date") -> None:
         """
         Affiche les suggestions
 
@@ -170,47 +387,44 @@ class Suggestion(Cog):
         ----------
         state : str
             Le type de suggestions à afficher : En cours/Acceptées/Refusées/Fermées
+        sort : str
+            L'ordre des suggestions : les plus récentes ou les mieux notées
         """
-        suggestions = database.execute(
-            select(SuggestionModel)
+        score = func.coalesce(func.sum(SuggestionVoteModel.vote), 0).label("score")
+        order = score.desc() if sort == "score" else SuggestionModel.date.desc()
+        result = await database.execute_async(
+            select(SuggestionModel, score)
+            .outerjoin(SuggestionVoteModel)
             .where(
-            SuggestionModel.state == state,
-            SuggestionModel.guild_id == ctx.guild.id
+                SuggestionModel.state == state,
+                SuggestionModel.guild_id == ctx.guild.id,
             )
-            .order_by(SuggestionModel.date.desc())
+            .group_by(SuggestionModel.id)
+            .order_by(order, SuggestionModel.date.desc())
             .limit(10)
-        ).scalars().all()
+        )
+        rows = result.all()
 
-        if not suggestions:
+        if not rows:
             await ctx.reply("Aucune suggestion trouvée pour cet état.", ephemeral=True)
             return
 
-        if state == "accepted":
-            embed = discord.Embed(title=f"Suggestions acceptées", colour=0x77B255, timestamp=datetime.now())
-        elif state == "declined":
-            embed = discord.Embed(title=f"Suggestions refusées", colour=0xDD2E44, timestamp=datetime.now())
-        elif state == "closed":
-            embed = discord.Embed(title=f"Suggestions fermées", colour=0xA9A6A7, timestamp=datetime.now())
-        else:
-            embed = discord.Embed(title=f"Suggestions en cours", colour=0xA9A6A7, timestamp=datetime.now())
-
-        for i, suggestion in enumerate(suggestions):
+        colour, title = LISTS[state]
+        embed = discord.Embed(title=title, colour=colour, timestamp=datetime.now())
+        channel = GuildWrapper.get(ctx.guild).suggestion_channel
+        for i, (suggestion, score) in enumerate(rows, 1):
             user = ctx.guild.get_member(suggestion.author_id)
-            
-            if state == "open":
-                message = await GuildWrapper(ctx.guild).suggestion_channel.fetch_message(suggestion.message_id)
-                embed.add_field(
-                    name=f"{i+1} - Suggestion de {user.name if user else 'Utilisateur inconnu'} le {suggestion.date:%d/%m/%Y}",
-                    value=message.jump_url,
-                    inline=False,
-                )
+            name = (
+                f"{i} - Suggestion de {user.name if user else 'Utilisateur inconnu'} "
+                f"le {suggestion.date:%d/%m/%Y} (score : {score:+d})"
+            )
+            if state == "open" and channel is not None:
+                # Builds the link without fetching the message
+                message = channel.get_partial_message(suggestion.message_id)
+                embed.add_field(name=name, value=message.jump_url, inline=False)
             else:
                 description_embed = suggestion.description.replace("\n", "\n> ")
-                embed.add_field(
-                    name=f"{i+1} - Suggestion de {user.name if user else 'Utilisateur inconnu'} le {suggestion.date:%d/%m/%Y}",
-                    value=f"> {description_embed}",
-                    inline=False,
-                )
+                embed.add_field(name=name, value=f"> {description_embed}", inline=False)
 
         await ctx.send(embed=embed)
 
@@ -1,8 +1,10 @@
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy import Integer, BigInteger, Column, DateTime, String, Text, ForeignKey
-from sqlalchemy.schema import PrimaryKeyConstraint, ForeignKeyConstraint
+from sqlalchemy.schema import PrimaryKeyConstraint, ForeignKeyConstraint, Index
 
 Base = declarative_base()
+# SQLite only autoincrements INTEGER primary keys
+SerialId = BigInteger().with_variant(Integer, "sqlite")
 
 
 class GuildModel(Base):
@@ -19,7 +21,6 @@ class GuildModel(Base):
 
 class MemberModel(Base):
     __tablename__ = "members"
-    __table_args__ = (PrimaryKeyConstraint("id", "guild_id", name="members_pkey"),)
     id: int = Column(BigInteger)
     guild_id: int = Column(BigInteger, ForeignKey("guilds.id", ondelete="CASCADE"))
     name: str = Column(String(50))
@@ -30,14 +31,30 @@ class MemberModel(Base):
     engineering_school: str = Column(String(50), nullable=True)
     generation: int = Column(Integer, nullable=True)
 
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "guild_id", name="members_pkey"),
+        # Covers the leaderboard: top-k by guild and rank counting
+        Index(
+            "members_guild_id_messages_count_idx",
+            guild_id,
+            messages_count.desc(),
+            id,
+        ),
+        Index("members_guild_id_high_school_idx", guild_id, high_school),
+        Index("members_guild_id_engineering_school_idx", guild_id, engineering_school),
+    )
+
     def __repr__(self):
         return f"Member(id={self.id}, name={self.name}, role={self.role})"
 
 
 class SuggestionModel(Base):
     __tablename__ = "suggestions"
+    __table_args__ = (
+        Index("suggestions_guild_id_state_date_idx", "guild_id", "state", "date"),
+    )
 
-    id: int = Column(BigInteger, primary_key=True, autoincrement=True)
+    id: int = Column(SerialId, primary_key=True, autoincrement=True)
     author_id: int = Column(BigInteger)
     guild_id: int = Column(BigInteger, ForeignKey("guilds.id", ondelete="CASCADE"))
     date = Column(DateTime, nullable=True)
@@ -51,6 +68,27 @@ class SuggestionModel(Base):
         )
 
 
+class SuggestionVoteModel(Base):
+    __tablename__ = "suggestion_votes"
+    __table_args__ = (
+        # One vote by member for each suggestion
+        PrimaryKeyConstraint(
+            "suggestion_id", "member_id", name="suggestion_votes_pkey"
+        ),
+    )
+    suggestion_id: int = Column(
+        SerialId, ForeignKey("suggestions.id", ondelete="CASCADE")
+    )
+    member_id: int = Column(BigInteger)
+    vote: int = Column(Integer, nullable=False)  # 1 for, -1 against
+
+    def __repr__(self):
+        return (
+            f"SuggestionVote(suggestion={self.suggestion_id}, member={self.member_id}, "
+            f"vote={self.vote})"
+        )
+
+
 class SanctionModel(Base):
     __tablename__ = "sanctions"
     __table_args__ = (
@@ -60,8 +98,12 @@ class SanctionModel(Base):
             ondelete="CASCADE",
             name="sanctions_to_id_guild_id_fkey",
         ),
+        # Serves warns of a guild as well as warns of a member in a guild
+        Index("sanctions_guild_id_type_to_id_idx", "guild_id", "type", "to_id"),
+        # Pages of /warnlist, sorted from the most recent warn
+        Index("sanctions_guild_id_type_id_idx", "guild_id", "type", "id"),
     )
-    id: int = Column(BigInteger, primary_key=True, autoincrement=True)
+    id: int = Column(SerialId, primary_key=True, autoincrement=True)
     by_id: int = Column(BigInteger)
     to_id: int = Column(BigInteger)
     guild_id: int = Column(BigInteger, ForeignKey("guilds.id", ondelete="CASCADE"))
@@ -74,3 +116,25 @@ class SanctionModel(Base):
             f"Sanction(by={self.by_id}, to={self.to_id}, type={self.type},"
             f"description={self.description:30.30}"
         )
+
+
+class ActivityModel(Base):
+    __tablename__ = "activity"
+    __table_args__ = (
+        PrimaryKeyConstraint(
+            "guild_id", "start", "span", "channel_id", "member_id", name="activity_pkey"
+        ),
+    )
+    # Not a foreign key: messages may be counted before their guild is registered
+    guild_id: int = Column(BigInteger)
+    channel_id: int = Column(BigInteger)
+    member_id: int = Column(BigInteger)
+    start: int = Column(Integer)  # Hours since the epoch (UTC)
+    span: int = Column(Integer)  # 1 for hourly rows, 24 once compacted in daily rows
+    count: int = Column(Integer, default=0)
+
+    def __repr__(self):
+        return (
+            f"Activity(member={self.member_id}, channel={self.channel_id}, "
+            f"start={self.start}, span={self.span}, count={self.count})"
+        )
@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from mp2i import CONFIG
+
+
+class LRUCache:
+    """
+    A bounded mapping which evicts the least recently used entries,
+    and entries older than the time to live if one is given.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value of the key and marks it as recently used
+        """
+        if (value := self.peek(key)) is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        Returns the value of the key without updating statistics and order
+        """
+        if (entry := self._data.get(key)) is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if (entry := self._data.pop(key, None)) is None:
+            return default
+        return entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses and hit rate to help sizing the cache
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_members_cache_config = CONFIG.get("bot", {}).get("members_cache", {})
+# Members models shared by all MemberWrapper, keyed by (guild_id, member_id)
+members_cache = LRUCache(
+    maxsize=_members_cache_config.get("size", 4096),
+    ttl=_members_cache_config.get("ttl", 600),
+)
@@ -0,0 +1,56 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from mp2i import CONFIG
+
+
+class RoleConfig(NamedTuple):
+    id: int
+    emoji: Optional[str] = None
+    choice: bool = False
+
+
+class ChannelsConfig(NamedTuple):
+    suggestion: int = 0
+    website: int = 0
+    log: int = 0
+    admin: int = 0
+
+
+class GuildConfig(NamedTuple):
+    """
+    Immutable guild configuration, compiled once from the YAML config file.
+    """
+
+    name: str
+    link: Optional[str]
+    roles: Mapping[str, RoleConfig]
+    channels: ChannelsConfig
+    log_webhook: Optional[str] = None  # Posts logs with a separate rate limit
+
+
+def compile_guild_config(guild_id: int) -> Optional[GuildConfig]:
+    """
+    Returns the configuration of the guild, or None if it is not configured.
+    """
+    if (config := CONFIG.get("guilds", {}).get(guild_id)) is None:
+        return None
+
+    roles = {
+        qualifier: RoleConfig(
+            id=role["id"], emoji=role.get("emoji"), choice=role.get("choice", False)
+        )
+        for qualifier, role in (config.get("roles") or {}).items()
+    }
+    channels = {
+        name: channel_id or 0
+        for name, channel_id in (config.get("channels") or {}).items()
+        if name in ChannelsConfig._fields
+    }
+    return GuildConfig(
+        name=config.get("name", ""),
+        link=config.get("link"),
+        roles=MappingProxyType(roles),
+        channels=ChannelsConfig(**channels),
+        log_webhook=config.get("log_webhook"),
+    )
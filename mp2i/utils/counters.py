@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import DefaultDict, Dict, Tuple
+
+from sqlalchemy import bindparam, delete, func, literal, select, update
+
+from mp2i.models import ActivityModel, MemberModel
+from mp2i.utils import database
+from mp2i.utils.cache import members_cache
+from mp2i.utils.executors import loop_bound
+
+logger = logging.getLogger(__name__)
+
+
+# Hourly activity rows older than this number of days are compacted in daily rows
+ACTIVITY_HOURLY_DAYS = 2
+
+
+def current_hour() -> int:
+    """
+    Returns the number of hours since the epoch, used as activity bucket
+    """
+    return int(time.time() // 3600)
+
+
+def hourly_cutoff() -> int:
+    """
+    Returns the first hour of the activity kept by hour, older activity is
+    compacted by day
+    """
+    return current_hour() // 24 * 24 - ACTIVITY_HOURLY_DAYS * 24
+
+
+class MessagesCounter:
+    """
+    Buffers messages count increments in memory and writes them in bulk,
+    instead of running an UPDATE for each message.
+    Messages are also counted by channel and hour in the activity table.
+    """
+
+    def __init__(self, max_pending: int = 500):
+        self.max_pending = max_pending
+        self._pending: DefaultDict[Tuple[int, int], int] = defaultdict(int)
+        self._activity: DefaultDict[Tuple[int, int, int, int], int] = defaultdict(int)
+        self._total = 0
+        # Increments being written, still counted until the write is committed
+        self._writing: Dict[Tuple[int, int], int] = {}
+
+    @loop_bound
+    def _lock(self) -> asyncio.Lock:
+        return asyncio.Lock()
+
+    def pending(self, guild_id: int, member_id: int) -> int:
+        """
+        Returns the increments of a member which are not yet written
+        """
+        key = (guild_id, member_id)
+        return self._pending.get(key, 0) + self._writing.get(key, 0)
+
+    async def increment(self, guild_id: int, channel_id: int, member_id: int) -> None:
+        """
+        Adds a message to a member, flushes the buffer if it is full
+        """
+        self._pending[guild_id, member_id] += 1
+        self._activity[guild_id, channel_id, member_id, current_hour()] += 1
+        self._total += 1
+        if self._total >= self.max_pending:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Writes all pending increments, with one executemany by table.
+        Concurrent calls wait for the write in progress, so that counts are
+        committed when they return.
+        """
+        async with self._lock:
+            if not self._pending and not self._activity:
+                return
+            # Swap buffers before any await, increments arriving meanwhile are kept
+            pending, self._pending = self._pending, defaultdict(int)
+            activity, self._activity = self._activity, defaultdict(int)
+            self._total = 0
+            self._writing = pending
+            counts_written = activity_written = False
+            try:
+                # An executemany needs at least one row, empty buffers are skipped
+                counts_written = not pending or await self._write_counts(pending)
+                activity_written = not activity or await self._write_activity(activity)
+            except Exception:
+                logger.exception("Can't write messages counts, retry later")
+            finally:
+                self._writing = {}
+                # Buffers not written are merged back and retried by the next flush
+                if not counts_written:
+                    for key, delta in pending.items():
+                        self._pending[key] += delta
+                if not activity_written:
+                    for key, count in activity.items():
+                        self._activity[key] += count
+                self._total = sum(self._pending.values())
+
+    async def _write_counts(self, pending: Dict[Tuple[int, int], int]) -> bool:
+        stmt = (
+            update(MemberModel.__table__)
+            .where(
+                MemberModel.id == bindparam("member_id"),
+                MemberModel.guild_id == bindparam("member_guild_id"),
+            )
+            .values(messages_count=MemberModel.messages_count + bindparam("delta"))
+        )
+        params = [
+            {"member_guild_id": guild_id, "member_id": member_id, "delta": delta}
+            for (guild_id, member_id), delta in pending.items()
+        ]
+        if await database.execute_async(stmt, params) is None:
+            logger.error(f"Can't write {len(params)} messages counts, retry later")
+            return False
+        # Keeps cached models consistent with the written counts
+        for key, delta in pending.items():
+            if (model := members_cache.peek(key)) is not None:
+                model.messages_count += delta
+        return True
+
+    async def _write_activity(self, activity: Dict[tuple, int]) -> bool:
+        stmt = database.insert_or_increment(ActivityModel.__table__, "count")
+        params = [
+            {
+                "guild_id": guild_id,
+                "channel_id": channel_id,
+                "member_id": member_id,
+                "start": hour,
+                "span": 1,
+                "count": count,
+            }
+            for (guild_id, channel_id, member_id, hour), count in activity.items()
+        ]
+        if await database.execute_async(stmt, params) is None:
+            logger.error(f"Can't write {len(params)} activity rows, retry later")
+            return False
+        return True
+
+
+async def rollup_activity() -> None:
+    """
+    Compacts old hourly activity rows into daily rows, in a single transaction.
+    """
+    table = ActivityModel.__table__
+    # Only whole days are compacted, the bucket of a day is its first hour
+    cutoff = hourly_cutoff()
+    day = (table.c.start - table.c.start % 24).label("start")
+    daily = (
+        select(
+            table.c.guild_id,
+            table.c.channel_id,
+            table.c.member_id,
+            day,
+            literal(24).label("span"),
+            func.sum(table.c.count).label("count"),
+        )
+        .where(table.c.span == 1, table.c.start < cutoff)
+        .group_by(table.c.guild_id, table.c.channel_id, table.c.member_id, day)
+    )
+    columns = ["guild_id", "channel_id", "member_id", "start", "span", "count"]
+    await database.execute_transaction(
+        database.insert_or_increment(table, "count").from_select(columns, daily),
+        delete(table).where(table.c.span == 1, table.c.start < cutoff),
+    )
+
+
+messages_counter = MessagesCounter()
@@ -1,36 +1,205 @@
+import asyncio
 import logging
 import os
+import time
+from typing import Any, Optional
 
 import sqlalchemy
 import sqlalchemy.exc
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
+from mp2i import CONFIG
 from mp2i.models import Base
 
 logger = logging.getLogger(__name__)
 
-if __database_url := os.getenv("DATABASE_URL"):
-    # Raise ImportError is driver is not installed,
-    # other errors are due to an incorrect url syntax
-    engine = sqlalchemy.create_engine(__database_url)
-else:
+# Async drivers used for each backend, the sync engine is kept as a fallback
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+    "mysql": "aiomysql",
+}
+SLOW_CHECKOUT = 0.1  # Seconds waited for a connection before logging a warning
+
+_config = CONFIG.get("database") or {}
+
+
+def _setting(name: str, default: Any) -> Any:
+    """
+    Reads a database setting from the environment (DATABASE_<NAME>),
+    then from the database section of bot-config.yaml.
+    """
+    if (value := os.getenv(f"DATABASE_{name.upper()}")) is None:
+        return _config.get(name, default)
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    return type(default)(value)
+
+
+def _engine_options(url: URL) -> dict:
+    """
+    Returns pool and connection options of an engine from the settings.
+    """
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # Statements may run in worker threads: they must share the same
+            # connection, otherwise each thread would see a different empty database.
+            return {
+                "poolclass": StaticPool,
+                "connect_args": {"check_same_thread": False},
+            }
+        # SQLite allows a single writer: one pooled connection serializes writes
+        # instead of failing on locks, WAL lets other processes read meanwhile.
+        options = {"pool_size": 1, "max_overflow": 0}
+        if url.get_driver_name() == "aiosqlite":
+            return {"poolclass": AsyncAdaptedQueuePool, **options}
+        return {
+            "poolclass": QueuePool,
+            "connect_args": {"check_same_thread": False},
+            **options,
+        }
+
+    options = {
+        "pool_size": _setting("pool_size", 5),
+        "max_overflow": _setting("max_overflow", 10),
+        "pool_timeout": _setting("pool_timeout", 30),
+        "pool_recycle": _setting("pool_recycle", 1800),
+        # A ping before each checkout costs a round-trip, pool_recycle already
+        # replaces connections before the server closes them
+        "pool_pre_ping": _setting("pool_pre_ping", False),
+    }
+    # Milliseconds before the server cancels a statement, 0 to disable it
+    timeout = _setting("statement_timeout", 0)
+    if timeout and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            server_settings = {"statement_timeout": str(timeout)}
+            options["connect_args"] = {"server_settings": server_settings}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Tunes each new SQLite connection for a durable and concurrent usage.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, fsync at checkpoints
+    cursor.execute(f"PRAGMA mmap_size={_setting('sqlite_mmap_size', 268435456)}")
+    cursor.execute(f"PRAGMA busy_timeout={_setting('sqlite_busy_timeout', 5000)}")
+    cursor.execute("PRAGMA foreign_keys=ON")  # Cascades deletions like other backends
+    cursor.close()
+
+
+if not (__database_url := os.getenv("DATABASE_URL")):
     # At this point, no url was specified for a remote database, let's create one
+    sqlite_path = _setting("sqlite_path", "data/mp2i.db")
     logger.warning(
         "You have not specified an DATABASE_URL environment variable, "
-        "a local SQLLite database will be created. "
+        f"a local SQLLite database will be used: {sqlite_path}. "
         "Please, restart the script if this is not the desired behavior "
     )
-    engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    if sqlite_path != ":memory:":
+        os.makedirs(os.path.dirname(sqlite_path) or ".", exist_ok=True)
+    __database_url = f"sqlite:///{sqlite_path}"
+
+# Raise ImportError is driver is not installed,
+# other errors are due to an incorrect url syntax
+engine = sqlalchemy.create_engine(
+    __database_url, **_engine_options(make_url(__database_url))
+)
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 # Creates tables from models
 Base.metadata.create_all(engine)
 
 
+def _create_async_engine() -> Optional[AsyncEngine]:
+    """
+    Creates an async engine on the same database as the sync engine.
+    Returns None if no async driver is available for this backend.
+    """
+    backend = engine.url.get_backend_name()
+    if backend == "sqlite" and engine.url.database in (None, "", ":memory:"):
+        return None  # An async engine would open another in-memory database
+
+    if (driver := ASYNC_DRIVERS.get(backend)) is None:
+        return None
+    url = engine.url.set(drivername=f"{backend}+{driver}")
+    try:
+        async_engine = create_async_engine(url, **_engine_options(url))
+    except (ImportError, sqlalchemy.exc.NoSuchModuleError):
+        return None
+    if backend == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return async_engine
+
+
+if (async_engine := _create_async_engine()) is not None:
+    # Objects must stay readable after the commit, lazy loads can't be awaited
+    async_session = sessionmaker(
+        async_engine, class_=AsyncSession, expire_on_commit=False
+    )
+else:
+    logger.warning(
+        f"No async driver available for {engine.dialect.name}, "
+        "statements will be executed in a thread pool with the sync engine."
+    )
+
+
+class CheckoutStatistics:
+    """
+    Counts connections checkouts and the time waited for them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > SLOW_CHECKOUT:
+            logger.warning(
+                f"Waited {wait:.3f}s for a database connection: {pool_status()}"
+            )
+
+
+checkouts = CheckoutStatistics()
+
+
+def pool_status() -> dict:
+    """
+    Returns live statistics of the connection pool used to execute statements.
+    """
+    pool = (async_engine.sync_engine if async_engine else engine).pool
+    status = {
+        "checkouts": checkouts.count,
+        "average_wait": checkouts.total_wait / max(checkouts.count, 1),
+        "max_wait": checkouts.max_wait,
+    }
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow()
+        )
+    return status
+
+
 def test_connection():
     """
     Tests if the connection to the database.
     """
     try:
-        engine.connect()  # test connection
+        with engine.connect():  # test connection, then gives it back to the pool
+            pass
     except (
         sqlalchemy.exc.ProgrammingError,
         sqlalchemy.exc.InterfaceError,
@@ -46,18 +215,63 @@ def test_connection():
     return True
 
 
+async def close() -> None:
+    """
+    Closes pooled connections, async drivers keep a thread alive for each of them.
+    """
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+
+def _execute_in_transaction(*stmts, params=()):
+    """
+    Executes the statements in a single transaction and returns the last result.
+    """
+    try:
+        # The transaction is rolled back if any statement fails. Returned models
+        # are detached, they must not be expired to be read after the commit.
+        with Session(engine, expire_on_commit=False) as session, session.begin():
+            start = time.perf_counter()
+            session.connection()  # Checkout a connection from the pool
+            checkouts.record(time.perf_counter() - start)
+            for stmt in stmts:
+                # https://docs.sqlalchemy.org/en/14/errors.html#error-lkrp
+                result = session.execute(
+                    stmt, *params, execution_options={"prebuffer_rows": True}
+                )
+    except sqlalchemy.exc.DBAPIError as err:
+        # https://docs.sqlalchemy.org/en/13/core/exceptions.html
+        logger.error(
+            f"The following statement execution has failed: \n"
+            f"{err.statement} \n"
+            f"Full error stack: {err}"
+        )
+        return None
+    return result
+
+
 def execute(stmt, *args):
     """
     Creates a Session to execute the given statement.
     """
-    with Session(engine, autocommit=True) as session:
+    return _execute_in_transaction(stmt, params=args)
+
+
+async def _execute_async_in_transaction(*stmts, params=()):
+    """
+    Executes the statements in a single transaction with the async engine.
+    """
+    async with async_session() as session:
         try:
-            # https://docs.sqlalchemy.org/en/14/errors.html#error-lkrp
-            result = session.execute(
-                stmt, *args, execution_options={"prebuffer_rows": True}
-            )
+            start = time.perf_counter()
+            await session.connection()  # Checkout a connection from the pool
+            checkouts.record(time.perf_counter() - start)
+            # Rows are prebuffered by the AsyncSession, the result outlives it
+            for stmt in stmts:
+                result = await session.execute(stmt, *params)
+            await session.commit()
         except sqlalchemy.exc.DBAPIError as err:
-            # https://docs.sqlalchemy.org/en/13/core/exceptions.html
             logger.error(
                 f"The following statement execution has failed: \n"
                 f"{err.statement} \n"
@@ -68,5 +282,64 @@ def execute(stmt, *args):
     return None
 
 
+async def execute_async(stmt, *args):
+    """
+    Executes the given statement without blocking the event loop.
+    Falls back on the sync engine in a worker thread if no async driver is available.
+    """
+    if async_engine is None:
+        return await asyncio.to_thread(execute, stmt, *args)
+    return await _execute_async_in_transaction(stmt, params=args)
+
+
+async def execute_transaction(*stmts):
+    """
+    Executes the statements in a single transaction and returns the last result.
+    """
+    if async_engine is None:
+        return await asyncio.to_thread(_execute_in_transaction, *stmts)
+    return await _execute_async_in_transaction(*stmts)
+
+
+async def execute_returning(stmt, query):
+    """
+    Executes an INSERT or UPDATE statement and returns the rows of the query.
+    Uses RETURNING when the dialect supports it, otherwise the query is executed
+    after the statement in the same transaction.
+    """
+    if engine.dialect.full_returning:
+        return await execute_async(stmt.returning(*query.selected_columns))
+    return await execute_transaction(stmt, query)
+
+
 def get_dialect() -> str:
     return engine.dialect.name
+
+
+def insert_ignore(table):
+    """
+    Returns an INSERT statement which skips rows conflicting with existing ones.
+    """
+    if get_dialect() == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if get_dialect() == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return sqlalchemy.insert(table).prefix_with("IGNORE")  # MySQL syntax
+
+
+def insert_or_increment(table, column: str):
+    """
+    Returns an INSERT statement which adds the inserted value of the column
+    to the existing row when the primary key already exists.
+    """
+    if get_dialect() in ("postgresql", "sqlite"):
+        dialect = postgresql if get_dialect() == "postgresql" else sqlite
+        stmt = dialect.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={column: table.c[column] + stmt.excluded[column]},
+        )
+    stmt = mysql.insert(table)
+    return stmt.on_duplicate_key_update(
+        {column: table.c[column] + stmt.inserted[column]}
+    )
@@ -1,6 +1,8 @@
 import logging
 from functools import wraps
 
+import discord
+
 from discord.ext.commands.errors import NoPrivateMessage, MissingAnyRole
 from discord.ext.commands import check
 
@@ -25,6 +27,14 @@ def defer(ephemeral: bool = False):
     return decorator
 
 
+def member_has_any_role(member: discord.Member, *items: str) -> bool:
+    """
+    Checks if the member has any of the specified roles, given by qualifier.
+    """
+    roles_id = GuildWrapper.get(member.guild).get_roles_id(*items)
+    return not roles_id.isdisjoint(role.id for role in member.roles)
+
+
 def has_any_role(*items: str):
     """
     Decorator that check if the user has any of the specified roles.
@@ -35,14 +45,10 @@ def has_any_role(*items: str):
             raise NoPrivateMessage()
 
         # ctx.guild is None doesn't narrow ctx.author to Member
-        guild = GuildWrapper(ctx.guild)
-        roles_id = {role.id for role in ctx.author.roles}
-        for item in items:
-            if (role := guild.get_role_by_qualifier(item)) is None:
-                logger.error(f"{item} role is not defined in the configuration file")
-            elif role.id in roles_id:
-                return True
+        if member_has_any_role(ctx.author, *items):
+            return True
 
         raise MissingAnyRole(list(items))
 
+    predicate.qualifiers = items  # Roles which change the result of the check
     return check(predicate)
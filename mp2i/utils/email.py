@@ -8,6 +8,7 @@ import re
 from email.message import EmailMessage
 
 from mp2i import STATIC_DIR
+from mp2i.utils import executors
 
 logger = logging.getLogger(__name__)
 
@@ -38,10 +39,7 @@ def is_academic_email(email: str) -> bool:
         return match.group(1) in academies
 
 
-def send(receiver_email: str, message: str) -> bool:
-    """
-    Send an email from credentials in .env
-    """
+def _send(receiver_email: str, message: str) -> bool:
     if not (__SMTP_SERVER and __EMAIL_USER and __EMAIL_PASSWORD):
         return False
 
@@ -60,6 +58,13 @@ def send(receiver_email: str, message: str) -> bool:
         return False
 
 
+async def send(receiver_email: str, message: str) -> bool:
+    """
+    Send an email from credentials in .env, without blocking the event loop
+    """
+    return await executors.io.run(_send, receiver_email, message)
+
+
 def generate_verification_code() -> str:
     """
     Generate a random 6 digit code
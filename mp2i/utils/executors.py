@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cached_property, partial
+from typing import Any, Callable, Optional
+
+from mp2i import CONFIG
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALL = 2.0  # Seconds before a call is logged as slow
+
+_config = CONFIG.get("executors") or {}
+
+
+class loop_bound(cached_property):
+    """
+    A cached property for asyncio primitives, created on first access from a
+    coroutine: before Python 3.10, a primitive is bound to the event loop that
+    is current when it is created, which may not be the one running the bot.
+    """
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls in a pool, shared by the integrations of a same kind.
+    At most max_pending calls wait or run at once, further callers wait for
+    a slot. The pool is created on first use and calls are timed.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self.pending = 0  # Calls waiting for a slot or running
+        self.max_depth = 0
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+
+    @loop_bound
+    def _semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_pending)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs the function in the pool without blocking the event loop
+        """
+        if self._executor is None:
+            self._executor = self._factory()
+
+        self.pending += 1
+        self.max_depth = max(self.max_depth, self.pending)
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor, partial(func, *args, **kwargs)
+                )
+        finally:
+            self.pending -= 1
+            self._record(func, time.perf_counter() - start)
+
+    def _record(self, func: Callable, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed > SLOW_CALL:
+            logger.warning(
+                f"{func.__qualname__} took {elapsed:.2f}s in {self.name} pool: "
+                f"{self.stats()}"
+            )
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "max_depth": self.max_depth,
+            "calls": self.calls,
+            "average_time": self.total_time / max(self.calls, 1),
+            "max_time": self.max_time,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Network calls of HTTP clients and SMTP, which release the GIL while waiting
+io = BoundedExecutor(
+    "io",
+    partial(
+        ThreadPoolExecutor,
+        max_workers=_config.get("io_workers", 8),
+        thread_name_prefix="mp2i-io",
+    ),
+    max_pending=_config.get("io_max_pending", 64),
+)
+# youtube_dl extraction, which spends most of its time parsing in Python. Workers
+# are not forked from the bot: a lock held by one of its threads would stay held
+# forever in the child.
+processes = BoundedExecutor(
+    "processes",
+    partial(
+        ProcessPoolExecutor,
+        max_workers=_config.get("process_workers", 2),
+        mp_context=multiprocessing.get_context("forkserver"),
+    ),
+    max_pending=_config.get("process_max_pending", 16),
+)
+
+
+def stats() -> dict:
+    return {executor.name: executor.stats() for executor in (io, processes)}
+
+
+def shutdown() -> None:
+    """
+    Stops the pools, pending calls are cancelled
+    """
+    logger.info(f"Executors: {stats()}")
+    io.shutdown()
+    processes.shutdown()
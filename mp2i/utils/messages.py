@@ -0,0 +1,168 @@
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import discord
+
+from mp2i import CONFIG
+
+MESSAGE_OVERHEAD = 512  # Estimated bytes of a cached message without its strings
+
+
+class CachedMessage:
+    """
+    The fields of a fetched message used by the cogs, with its reactions counts.
+    Much lighter than a discord.Message, which references its whole state.
+    """
+
+    __slots__ = (
+        "id",
+        "channel_id",
+        "author_name",
+        "author_avatar",
+        "content",
+        "jump_url",
+        "reactions",
+    )
+
+    def __init__(self, message: discord.Message):
+        self.id = message.id
+        self.channel_id = message.channel.id
+        self.author_name = message.author.name
+        self.author_avatar = message.author.display_avatar.url
+        self.content = message.content
+        self.jump_url = message.jump_url
+        # Number of reactions and whether the bot reacted, by emoji
+        self.reactions: Dict[str, List] = {
+            str(reaction.emoji): [reaction.count, reaction.me]
+            for reaction in message.reactions
+        }
+
+    def reaction(self, emoji: str) -> List:
+        """
+        Returns [count, me] of the reactions with this emoji
+        """
+        return self.reactions.get(emoji, [0, False])
+
+    @property
+    def size(self) -> int:
+        strings = (self.author_name, self.author_avatar, self.content, self.jump_url)
+        return (
+            MESSAGE_OVERHEAD
+            + sum(sys.getsizeof(string) for string in strings)
+            + 64 * len(self.reactions)
+        )
+
+
+class MessageCache:
+    """
+    A cache of fetched messages shared by the cogs, which evicts the least
+    recently used messages when their estimated size exceeds the memory cap.
+    Raw events keep cached messages in sync, so they are never fetched again.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[int, CachedMessage]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, message_id: int) -> Optional[CachedMessage]:
+        return self._data.get(message_id)
+
+    async def fetch(
+        self, channel: discord.abc.Messageable, message_id: int
+    ) -> CachedMessage:
+        """
+        Returns the cached message, fetches it from Discord on a miss.
+        Raises discord.NotFound if the message doesn't exist.
+        """
+        if (message := self._data.get(message_id)) is not None:
+            self.hits += 1
+            self._data.move_to_end(message_id)
+            return message
+        self.misses += 1
+        return self.add(await channel.fetch_message(message_id))
+
+    def add(self, message: discord.Message) -> CachedMessage:
+        self.remove(message.id)
+        cached = self._data[message.id] = CachedMessage(message)
+        self.bytes += cached.size
+        while self.bytes > self.max_bytes and self._data:
+            _, evicted = self._data.popitem(last=False)
+            self.bytes -= evicted.size
+        return cached
+
+    def remove(self, message_id: int) -> None:
+        if (cached := self._data.pop(message_id, None)) is not None:
+            self.bytes -= cached.size
+
+    def _update(self, message_id: int, update) -> None:
+        # Size changes with the content and reactions, it is computed again
+        if (cached := self._data.get(message_id)) is not None:
+            self.bytes -= cached.size
+            update(cached)
+            self.bytes += cached.size
+
+    def on_reaction_add(
+        self, payload: discord.RawReactionActionEvent, me: bool
+    ) -> None:
+        def update(cached: CachedMessage) -> None:
+            reaction = cached.reactions.setdefault(str(payload.emoji), [0, False])
+            reaction[0] += 1
+            reaction[1] = reaction[1] or me
+
+        self._update(payload.message_id, update)
+
+    def on_reaction_remove(
+        self, payload: discord.RawReactionActionEvent, me: bool
+    ) -> None:
+        def update(cached: CachedMessage) -> None:
+            if (reaction := cached.reactions.get(str(payload.emoji))) is None:
+                return
+            reaction[0] -= 1
+            reaction[1] = reaction[1] and not me
+            if reaction[0] <= 0:
+                del cached.reactions[str(payload.emoji)]
+
+        self._update(payload.message_id, update)
+
+    def on_reaction_clear(self, message_id: int, emoji: Optional[str] = None) -> None:
+        def update(cached: CachedMessage) -> None:
+            if emoji is None:
+                cached.reactions.clear()
+            else:
+                cached.reactions.pop(emoji, None)
+
+        self._update(message_id, update)
+
+    def on_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        def update(cached: CachedMessage) -> None:
+            cached.content = payload.data.get("content", cached.content)
+
+        self._update(payload.message_id, update)
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses, hit rate and memory usage to help sizing the cache
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_message_cache_config = CONFIG.get("bot", {}).get("message_cache", {})
+# Messages fetched by the cogs, keyed by message id
+message_cache = MessageCache(
+    max_bytes=_message_cache_config.get("max_bytes", 8 * 1024 * 1024)
+)
@@ -0,0 +1,125 @@
+import logging
+from typing import Callable, List
+
+from sqlalchemy import Column, Index, Integer, MetaData, Table, insert, select, update
+from sqlalchemy.engine import Connection
+
+from mp2i.utils import database
+
+logger = logging.getLogger(__name__)
+
+# Kept outside the models metadata, the table is managed by the migrations only
+_metadata = MetaData()
+schema_version = Table("schema_version", _metadata, Column("version", Integer))
+
+# Indexed columns of the tables, frozen so that migrations don't follow the models
+_members = Table(
+    "members",
+    _metadata,
+    Column("id"),
+    Column("guild_id"),
+    Column("messages_count"),
+    Column("high_school"),
+    Column("engineering_school"),
+)
+_suggestions = Table(
+    "suggestions", _metadata, Column("guild_id"), Column("state"), Column("date")
+)
+_sanctions = Table(
+    "sanctions",
+    _metadata,
+    Column("id"),
+    Column("guild_id"),
+    Column("type"),
+    Column("to_id"),
+)
+
+
+def _create_indexes(*indexes: Index) -> Callable[[Connection], None]:
+    """
+    Returns a migration which creates the given indexes if they don't exist.
+    """
+
+    def migrate(connection: Connection) -> None:
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+
+    names = ", ".join(index.name for index in indexes)
+    migrate.__doc__ = f"Creates indexes {names}"
+    return migrate
+
+
+# Ordered migrations, each one must be idempotent. Never remove, reorder or edit
+# them, the position of a migration in this list is its version number.
+MIGRATIONS: List[Callable[[Connection], None]] = [
+    # /leaderboard, /members and /referents
+    _create_indexes(
+        Index(
+            "members_guild_id_messages_count_idx",
+            _members.c.guild_id,
+            _members.c.messages_count.desc(),
+            _members.c.id,
+        ),
+        Index(
+            "members_guild_id_high_school_idx",
+            _members.c.guild_id,
+            _members.c.high_school,
+        ),
+        Index(
+            "members_guild_id_engineering_school_idx",
+            _members.c.guild_id,
+            _members.c.engineering_school,
+        ),
+    ),
+    # /suggestions
+    _create_indexes(
+        Index(
+            "suggestions_guild_id_state_date_idx",
+            _suggestions.c.guild_id,
+            _suggestions.c.state,
+            _suggestions.c.date,
+        ),
+    ),
+    # /warnlist
+    _create_indexes(
+        Index(
+            "sanctions_guild_id_type_to_id_idx",
+            _sanctions.c.guild_id,
+            _sanctions.c.type,
+            _sanctions.c.to_id,
+        ),
+    ),
+    # Pages of /warnlist
+    _create_indexes(
+        Index(
+            "sanctions_guild_id_type_id_idx",
+            _sanctions.c.guild_id,
+            _sanctions.c.type,
+            _sanctions.c.id,
+        ),
+    ),
+]
+
+
+def get_version(connection: Connection) -> int:
+    return connection.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def upgrade() -> int:
+    """
+    Applies migrations not yet applied to the database and returns its version.
+    """
+    with database.engine.begin() as connection:
+        schema_version.create(connection, checkfirst=True)
+        current = get_version(connection)
+        if not connection.execute(select(schema_version)).first():
+            connection.execute(insert(schema_version).values(version=0))
+
+    for version, migrate in enumerate(MIGRATIONS[current:], current + 1):
+        logger.info(f"Applying migration {version}: {migrate.__doc__}")
+        # One transaction by migration, applied ones are kept if another fails
+        with database.engine.begin() as connection:
+            migrate(connection)
+            connection.execute(update(schema_version).values(version=version))
+
+    return max(current, len(MIGRATIONS))
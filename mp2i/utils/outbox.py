@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import logging
+from typing import Dict, List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+MAX_EMBEDS = 10  # Embeds by message, limit of Discord
+MAX_CHARACTERS = 6000  # Characters of all embeds of a message, limit of Discord
+
+
+def next_batch(embeds: List[discord.Embed]) -> List[discord.Embed]:
+    """
+    Returns the first embeds of the list which fit in a single message
+    """
+    batch, characters = [], 0
+    for embed in embeds[:MAX_EMBEDS]:
+        characters += len(embed)
+        if batch and characters > MAX_CHARACTERS:
+            break
+        batch.append(embed)
+    return batch
+
+
+class EmbedQueue:
+    """
+    Sends the embeds of a channel with up to 10 embeds by message, gathered
+    during a short window, so that bursts of events don't hit the rate limit
+    of the channel. Messages are sent through the webhook if one is given,
+    which has its own rate limit.
+    """
+
+    def __init__(
+        self,
+        channel: discord.abc.Messageable,
+        webhook: Optional[discord.Webhook] = None,
+        window: float = 2.0,
+        max_size: int = 200,
+        put_timeout: float = 5.0,
+    ):
+        self.channel = channel
+        self.webhook = webhook
+        self.window = window
+        self.put_timeout = put_timeout
+        self.messages = 0
+        self.embeds = 0
+        self.dropped = 0
+        self._queue: "asyncio.Queue[discord.Embed]" = asyncio.Queue(max_size)
+        self._embeds: List[discord.Embed] = []  # Taken from the queue, not yet sent
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Optional[asyncio.Future] = None  # Batch being sent
+
+    async def put(self, embed: discord.Embed) -> bool:
+        """
+        Queues the embed. Waits for room if the queue is full, then drops the
+        embed if there is still no room after the timeout.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._queue.put(embed), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.warning(f"Embed dropped, the queue of {self.channel} is full")
+            return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            self._embeds.append(await self._queue.get())
+            await asyncio.sleep(self.window)  # Lets a burst gather in the queue
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while not self._queue.empty():
+            self._embeds.append(self._queue.get_nowait())
+        while self._embeds:
+            batch = next_batch(self._embeds)
+            del self._embeds[: len(batch)]  # Taken before sending, never sent twice
+            # Not interrupted by close, which waits for the batch being sent
+            self._sending = asyncio.ensure_future(self._send(batch))
+            await asyncio.shield(self._sending)
+
+    async def _send(self, batch: List[discord.Embed]) -> None:
+        try:
+            if self.webhook is not None:
+                await self.webhook.send(embeds=batch)
+            else:
+                await self.channel.send(embeds=batch)
+        except discord.HTTPException as err:
+            if err.status == 400 and len(batch) > 1:
+                # An invalid embed rejects the whole message, the others are
+                # sent one by one so that only the invalid ones are dropped
+                for embed in batch:
+                    await self._send([embed])
+                return
+            self.dropped += len(batch)
+            logger.error(f"Can't send {len(batch)} embeds in {self.channel}: {err}")
+        else:
+            self.messages += 1
+            self.embeds += len(batch)
+
+    async def close(self) -> None:
+        """
+        Stops the queue and sends the embeds still waiting
+        """
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        if self._sending is not None:
+            await self._sending
+        await self._flush()
+
+    def stats(self) -> dict:
+        return {
+            "messages": self.messages,
+            "embeds": self.embeds,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() + len(self._embeds),
+        }
+
+
+_queues: Dict[int, EmbedQueue] = {}
+
+
+def get_queue(
+    client: discord.Client,
+    channel: discord.TextChannel,
+    webhook_url: Optional[str] = None,
+) -> EmbedQueue:
+    """
+    Returns the queue of the channel, created on first use
+    """
+    if (queue := _queues.get(channel.id)) is None:
+        webhook = None
+        if webhook_url:
+            webhook = discord.Webhook.from_url(webhook_url, client=client)
+        queue = _queues[channel.id] = EmbedQueue(channel, webhook)
+    return queue
+
+
+async def close() -> None:
+    """
+    Sends the embeds waiting in all queues, used when the bot stops
+    """
+    for queue in _queues.values():
+        await queue.close()
+
+
+def stats() -> dict:
+    return {queue.channel.id: queue.stats() for queue in _queues.values()}
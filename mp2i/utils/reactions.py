@@ -0,0 +1,61 @@
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import discord
+
+# A handler returns False if it dropped the event before any request or query
+Handler = Callable[[discord.RawReactionActionEvent], Awaitable[bool]]
+
+
+class ReactionRouter:
+    """
+    Routes raw reaction events to at most one handler, chosen by dict lookups
+    on the message id then on the emoji, before any request or query is made.
+    """
+
+    def __init__(self):
+        self._messages: Dict[int, Tuple[str, Handler]] = {}
+        self._emojis: Dict[str, Tuple[str, Handler]] = {}
+        self.counts: Counter = Counter()
+
+    def watch_message(self, message_id: int, name: str, handler: Handler) -> None:
+        self._messages[message_id] = (name, handler)
+
+    def unwatch_message(self, message_id: int) -> None:
+        self._messages.pop(message_id, None)
+
+    def watch_emoji(self, emoji: str, name: str, handler: Handler) -> None:
+        self._emojis[emoji] = (name, handler)
+
+    def unwatch_emoji(self, emoji: str) -> None:
+        self._emojis.pop(emoji, None)
+
+    def _route(
+        self, payload: discord.RawReactionActionEvent
+    ) -> Tuple[str, Optional[Handler]]:
+        if payload.guild_id is None or payload.member is None or payload.member.bot:
+            return "ignored", None  # Reactions in DM and reactions of bots
+        if (route := self._messages.get(payload.message_id)) is not None:
+            return route
+        if (route := self._emojis.get(str(payload.emoji))) is not None:
+            return route
+        return "unrouted", None
+
+    async def dispatch(self, payload: discord.RawReactionActionEvent) -> None:
+        name, handler = self._route(payload)
+        if handler is None or not await handler(payload):
+            self.counts[name, "dropped"] += 1
+        else:
+            self.counts[name, "handled"] += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the number of events handled and dropped by each route
+        """
+        stats = {}
+        for (name, outcome), count in self.counts.items():
+            stats.setdefault(name, {"handled": 0, "dropped": 0})[outcome] = count
+        return stats
+
+
+reaction_router = ReactionRouter()
@@ -0,0 +1,82 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Set
+
+from mp2i.utils.cache import LRUCache
+
+FUZZY_MIN_SCORE = 0.5  # Part of the trigrams of the query found in a name
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+
+def fold(text: str) -> str:
+    """
+    Returns the words of the text in lowercase, without accents and punctuation:
+    "Lycée Saint-Louis" becomes "lycee saint louis".
+    """
+    text = unicodedata.normalize("NFKD", text.casefold().translate(LIGATURES))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def trigrams(text: str) -> Set[str]:
+    text = f" {text} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    An accent-insensitive index of names, built once. Names are ranked by
+    prefix of the whole name, then prefixes of their words, then similarity
+    of their trigrams, which tolerates typos. Results are cached by query.
+    """
+
+    def __init__(self, names: Sequence[str], cache_size: int = 1024):
+        self.names = list(names)
+        self._names = set(self.names)
+        self._folded = [fold(name) for name in self.names]
+        self._prefixes: Dict[str, Set[int]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[int]] = defaultdict(set)
+        for i, folded in enumerate(self._folded):
+            for word in folded.split():
+                for end in range(1, len(word) + 1):
+                    self._prefixes[word[:end]].add(i)
+            for trigram in trigrams(folded):
+                self._trigrams[trigram].add(i)
+        self._cache = LRUCache(maxsize=cache_size)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def search(self, query: str, limit: int = 25) -> List[str]:
+        """
+        Returns the names matching the query, best matches first
+        """
+        query = fold(query)
+        if (result := self._cache.get((query, limit))) is None:
+            result = [self.names[i] for i in self._search(query)[:limit]]
+            self._cache.set((query, limit), result)
+        return result
+
+    def _search(self, query: str) -> List[int]:
+        if not query:
+            return list(range(len(self.names)))
+
+        # Names with a word starting by each word of the query
+        words = query.split()
+        matches = set.intersection(*(self._prefixes.get(w, set()) for w in words))
+        ranks = {i: (0 if self._folded[i].startswith(query) else 1, 0) for i in matches}
+
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            i for trigram in query_trigrams for i in self._trigrams.get(trigram, ())
+        )
+        for i, count in shared.items():
+            score = count / len(query_trigrams)
+            if i not in ranks and score >= FUZZY_MIN_SCORE:
+                ranks[i] = (2, -score)
+
+        return sorted(ranks, key=lambda i: (*ranks[i], self._folded[i]))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -1,29 +1,255 @@
+import asyncio
+import json
 import logging
 import os
-from typing import Generator
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
+import youtube_dl
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from mp2i import CONFIG
+from mp2i.utils import executors
+from mp2i.utils.cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
+SEARCH_COST = 100  # Quota units spent by a search request of the YouTube API
+PLAYLIST_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+}
+
+_ytdl = None  # One extractor by process of the pool
+_flat_ytdl = None  # Lists the videos of playlists without extracting them
+
 
-def search(query: str, n=1) -> Generator[dict, None, None]:
+def normalize(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+class SearchClient:
     """
-    Search video on YouTube matching the query
+    Searches videos with the YouTube Data API. A client is built once by
+    worker thread, as they are not thread-safe. Results are cached by
+    normalized query in memory and on disk, and concurrent identical
+    searches share a single request.
     """
-    try:
-        youtube = build("youtube", "v3", developerKey=os.getenv("API_DEVELOPER_KEY"))
-        response = (
-            youtube.search()
-            .list(part="snippet", q=query, type="video", maxResults=n)
-            .execute()
-        )
-    except HttpError:
-        logger.error("You're Youtube API developer key is undefined or invalid")
-    else:
-        for video in response["items"]:
-            yield {
+
+    def __init__(self, path: str, ttl: float, maxsize: int):
+        self.path = path
+        self.ttl = ttl
+        self.requests = 0
+        self.disk_hits = 0
+        self.shared = 0  # Searches which waited for an identical request
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # Results saved on disk, with their expiration timestamp
+        self._store: Optional[Dict[str, Tuple[float, List[dict]]]] = None
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._local = threading.local()
+
+    @executors.loop_bound
+    def _save_lock(self) -> asyncio.Lock:
+        return asyncio.Lock()
+
+    def _client(self):
+        if (client := getattr(self._local, "client", None)) is None:
+            client = self._local.client = build(
+                "youtube",
+                "v3",
+                developerKey=os.getenv("API_DEVELOPER_KEY"),
+                cache_discovery=False,
+            )
+        return client
+
+    def _request(self, query: str, n: int) -> Optional[List[dict]]:
+        try:
+            response = (
+                self._client()
+                .search()
+                .list(part="snippet", q=query, type="video", maxResults=n)
+                .execute()
+            )
+        except HttpError:
+            logger.error("You're Youtube API developer key is undefined or invalid")
+            return None
+        return [
+            {
                 "name": video["snippet"]["title"],
                 "url": f"https://www.youtube.com/watch?v={video['id']['videoId']}",
             }
+            for video in response["items"]
+        ]
+
+    async def search(self, query: str, n: int = 1) -> List[dict]:
+        key = (normalize(query), n)
+        if (videos := self._cache.get(key)) is not None:
+            return videos
+        if (videos := await self._from_disk(key)) is not None:
+            return videos
+        if (future := self._pending.get(key)) is not None:
+            self.shared += 1
+            return await asyncio.shield(future)
+
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            self.requests += 1
+            videos = await executors.io.run(self._request, query, n)
+            if videos is not None:  # Errors are not cached
+                self._cache.set(key, videos)
+                await self._save(key, videos)
+            future.set_result(videos or [])
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as err:
+            future.set_exception(err)
+            future.exception()  # Marks it as retrieved when nobody else waits
+            raise
+        finally:
+            del self._pending[key]
+        return videos or []
+
+    def _store_key(self, key: Tuple[str, int]) -> str:
+        return f"{key[1]}:{key[0]}"
+
+    async def _from_disk(self, key: Tuple[str, int]) -> Optional[List[dict]]:
+        if self._store is None:
+            store = await executors.io.run(self._load)
+            if self._store is None:  # Not loaded by a concurrent search
+                self._store = store
+        if (entry := self._store.get(self._store_key(key))) is None:
+            return None
+        expires_at, videos = entry
+        if expires_at < time.time():
+            return None
+        self.disk_hits += 1
+        self._cache.set(key, videos)
+        return videos
+
+    def _load(self) -> Dict[str, Tuple[float, List[dict]]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {query: tuple(entry) for query, entry in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as err:
+            logger.warning(f"YouTube searches cache {self.path} ignored: {err}")
+            return {}
+
+    async def _save(self, key: Tuple[str, int], videos: List[dict]) -> None:
+        now = time.time()
+        self._store[self._store_key(key)] = (now + self.ttl, videos)
+        async with self._save_lock:  # Writes one after another, the last wins
+            self._store = {q: e for q, e in self._store.items() if e[0] >= now}
+            await executors.io.run(self._dump, dict(self._store))
+
+    def _dump(self, store: Dict[str, Tuple[float, List[dict]]]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(store, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)  # Never leaves a truncated file
+        except OSError as err:
+            logger.warning(f"Can't save YouTube searches cache: {err}")
+
+    def stats(self) -> dict:
+        """
+        Returns the requests made and the quota units saved by the caches
+        """
+        saved = self._cache.hits + self.disk_hits + self.shared
+        return {
+            "requests": self.requests,
+            "memory_hits": self._cache.hits,
+            "disk_hits": self.disk_hits,
+            "shared": self.shared,
+            "quota_spent": self.requests * SEARCH_COST,
+            "quota_saved": saved * SEARCH_COST,
+        }
+
+
+_search_config = CONFIG.get("youtube", {}).get("search_cache", {})
+search_client = SearchClient(
+    path=_search_config.get("path", "data/youtube-searches.json"),
+    ttl=_search_config.get("ttl", 7 * 24 * 3600),
+    maxsize=_search_config.get("size", 1024),
+)
+
+
+async def search(query: str, n=1) -> List[dict]:
+    """
+    Search video on YouTube matching the query
+    """
+    return await search_client.search(query, n)
+
+
+def stats() -> dict:
+    return search_client.stats()
+
+
+def best_audio_format(formats: List[dict]) -> dict:
+    """
+    Returns the audio only format with the best bitrate, Opus formats first
+    since they are played without transcoding
+    """
+    with_audio = [f for f in formats if f.get("acodec") not in (None, "none")]
+    audio_only = [f for f in with_audio if f.get("vcodec") == "none"]
+    return max(
+        audio_only or with_audio or formats,
+        key=lambda f: (f.get("acodec") == "opus", f.get("abr") or 0),
+    )
+
+
+def _extract_audio(url: str) -> dict:
+    global _ytdl
+    if _ytdl is None:
+        _ytdl = youtube_dl.YoutubeDL()
+    video = _ytdl.extract_info(url, download=False)
+    audio = best_audio_format(video.get("formats") or [video])
+    return {"url": audio["url"], "codec": audio.get("acodec")}
+
+
+async def extract_audio(url: str) -> dict:
+    """
+    Returns the url and codec of the best audio stream of a video,
+    extracted by youtube_dl
+    """
+    return await executors.processes.run(_extract_audio, url)
+
+
+def is_playlist_url(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.hostname in PLAYLIST_HOSTS and "list" in parse_qs(parsed.query)
+
+
+def _playlist(url: str, size: int) -> dict:
+    global _flat_ytdl
+    if _flat_ytdl is None:
+        _flat_ytdl = youtube_dl.YoutubeDL({"extract_flat": "in_playlist"})
+    # Without noplaylist, a video url with a list parameter gives the playlist
+    playlist = _flat_ytdl.extract_info(url, download=False)
+    return {
+        "name": playlist.get("title"),
+        "videos": [
+            {
+                "name": entry.get("title"),
+                "url": f"https://www.youtube.com/watch?v={entry['id']}",
+            }
+            for entry in (playlist.get("entries") or [])[:size]
+            if entry.get("id")
+        ],
+    }
+
+
+async def playlist(url: str, size: int = 100) -> dict:
+    """
+    Returns the name of the playlist and its first videos, listed without
+    extracting their streams
+    """
+    return await executors.processes.run(_playlist, url, size)
@@ -1,60 +1,259 @@
-from functools import cache, cached_property
-from typing import Optional, List
+import logging
+from functools import cached_property
+from typing import Dict, FrozenSet, Iterable, Optional, List, Tuple
 
 import discord
 import sqlalchemy.exc
-from sqlalchemy import insert, select, update
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.engine import Row
 
-from mp2i import CONFIG
 from mp2i.utils import database
-from mp2i.models import GuildModel
-from mp2i.utils.dotdict import DefaultDotDict
+from mp2i.models import ActivityModel, GuildModel, MemberModel
+from mp2i.utils.counters import messages_counter
+from mp2i.utils.config import compile_guild_config
+
+logger = logging.getLogger(__name__)
+
+# Rows read beyond the limit of the leaderboard, to skip members who left
+LEADERBOARD_MARGIN = 10
+# Members columns storing the school of each type
+SCHOOL_COLUMNS = {
+    "cpge": MemberModel.high_school,
+    "engineering": MemberModel.engineering_school,
+}
 
 
 class GuildWrapper:
     """
     A class that wraps a Discord guild and offers an interface for the database
     guild model.
+    Wrappers are long-lived, use `get` or `fetch` to reuse the one of a guild.
     """
 
+    __registry: Dict[int, "GuildWrapper"] = {}
+
     def __init__(self, guild: discord.Guild):
+        """
+        Wraps the guild without any database access, use `fetch` to load the model
+        """
         self.guild = guild
-        self.config = DefaultDotDict(dict, CONFIG).guilds.get(guild.id)
-        self.__model = self._fetch()
+        self.config = compile_guild_config(guild.id)
+        self.__model = None
+        self.__loaded = False
+        self.__roles_id: Dict[Tuple[str, ...], FrozenSet[int]] = {}
 
     def __getattr__(self, name: str):
         return getattr(self.guild, name)
 
-    def _fetch(self) -> Optional[GuildModel]:
+    @classmethod
+    def get(cls, guild: discord.Guild) -> "GuildWrapper":
+        """
+        Returns the registered wrapper of the guild, without any database access
+        """
+        wrapper = cls.__registry.get(guild.id)
+        if wrapper is None or wrapper.guild is not guild:
+            # The guild object is replaced by discord.py after a reconnection,
+            # cached channels are dropped but the model is still valid.
+            new_wrapper = cls(guild)
+            if wrapper is not None:
+                new_wrapper.__model = wrapper.__model
+                new_wrapper.__loaded = wrapper.__loaded
+            wrapper = cls.__registry[guild.id] = new_wrapper
+        return wrapper
+
+    @classmethod
+    async def fetch(cls, guild: discord.Guild) -> "GuildWrapper":
+        """
+        Returns the registered wrapper of the guild, with its model loaded.
+        The model is then refreshed only by `register` and `update`.
+        """
+        wrapper = cls.get(guild)
+        if not wrapper.__loaded:
+            wrapper.__model = await wrapper._fetch()
+            wrapper.__loaded = True
+        return wrapper
+
+    @classmethod
+    def invalidate(cls, guild_id: int) -> None:
+        """
+        Removes the wrapper of a guild from the registry
+        """
+        cls.__registry.pop(guild_id, None)
+
+    async def _fetch(self) -> Optional[GuildModel]:
         """
         Fetch from the database and returns the guild if exists
         """
         try:
-            return database.execute(
+            result = await database.execute_async(
                 select(GuildModel).where(GuildModel.id == self.guild.id)
-            ).scalar_one()
+            )
+            return result.scalar_one()
         except sqlalchemy.exc.NoResultFound:
             return None
 
-    def register(self) -> None:
-        database.execute(
+    async def register(self) -> None:
+        await database.execute_async(
             insert(GuildModel).values(id=self.guild.id, name=self.guild.name)
         )
-        self.__model = self._fetch()  # Update the model
+        self.__model = await self._fetch()  # Update the model
+        self.__loaded = True
 
-    def update(self, **kwargs) -> None:
+    async def update(self, **kwargs) -> None:
         """
         Accept keyword arguments only matching with a column in members table
         """
-        database.execute(
+        await database.execute_async(
             update(GuildModel).where(GuildModel.id == self.guild.id).values(**kwargs)
         )
-        self.__model = self._fetch()
+        self.__model = await self._fetch()
+        self.__loaded = True
 
     def exists(self) -> bool:
         return self.__model is not None
 
-    @cache
+    def _bots_id(self) -> List[int]:
+        return [member.id for member in self.guild.members if member.bot]
+
+    def _activity(self, since: int) -> tuple:
+        """
+        Returns the conditions on activity rows of members since the given hour
+        """
+        return (
+            ActivityModel.guild_id == self.guild.id,
+            ActivityModel.start >= since,
+            ActivityModel.member_id.notin_(self._bots_id()),
+        )
+
+    def _messages_counts(self, since: Optional[int]):
+        """
+        Returns a query of (id, messages_count) of members who are not bots,
+        counted since the given hour or since they joined if it is None
+        """
+        if since is None:
+            return select(MemberModel.id, MemberModel.messages_count).where(
+                MemberModel.guild_id == self.guild.id,
+                MemberModel.id.notin_(self._bots_id()),
+            )
+        return (
+            select(
+                ActivityModel.member_id.label("id"),
+                func.sum(ActivityModel.count).label("messages_count"),
+            )
+            .where(*self._activity(since))
+            .group_by(ActivityModel.member_id)
+        )
+
+    async def leaderboard(self, limit: int, since: Optional[int] = None) -> List[Row]:
+        """
+        Returns (id, name, messages_count) of the members with the most messages.
+        Members who left the guild are skipped: rows are read by pages from the
+        top of the index until enough members are found.
+        """
+        await messages_counter.flush()  # Pending counts must be in the ranking
+        counts = self._messages_counts(since).subquery()
+        query = (
+            select(counts.c.id, MemberModel.name, counts.c.messages_count)
+            .outerjoin(
+                MemberModel,
+                and_(
+                    MemberModel.id == counts.c.id,
+                    MemberModel.guild_id == self.guild.id,
+                ),
+            )
+            .order_by(counts.c.messages_count.desc(), counts.c.id)
+        )
+        rows: List[Row] = []
+        offset, page_size = 0, limit + LEADERBOARD_MARGIN
+        while len(rows) < limit:
+            result = await database.execute_async(query.offset(offset).limit(page_size))
+            page = result.all()
+            rows.extend(row for row in page if self.guild.get_member(row.id))
+            if len(page) < page_size:
+                break  # No more rows
+            offset += page_size
+            page_size *= 2
+        return rows[:limit]
+
+    async def channels_activity(self, limit: int, since: int) -> List[Row]:
+        """
+        Returns (id, messages_count) of the channels with the most messages
+        """
+        await messages_counter.flush()
+        messages_count = func.sum(ActivityModel.count).label("messages_count")
+        result = await database.execute_async(
+            select(ActivityModel.channel_id.label("id"), messages_count)
+            .where(*self._activity(since))
+            .group_by(ActivityModel.channel_id)
+            .order_by(messages_count.desc(), ActivityModel.channel_id)
+            .limit(limit)
+        )
+        return result.all()
+
+    async def messages_total(self, since: int) -> int:
+        """
+        Returns the number of messages sent by members since the given hour
+        """
+        await messages_counter.flush()
+        result = await database.execute_async(
+            select(func.sum(ActivityModel.count)).where(*self._activity(since))
+        )
+        return result.scalar() or 0
+
+    async def get_students(self, type: str, school: str) -> List[discord.Member]:
+        """
+        Returns members of the guild registered in the school of the given type
+        """
+        result = await database.execute_async(
+            select(MemberModel.id).where(
+                MemberModel.guild_id == self.guild.id, SCHOOL_COLUMNS[type] == school
+            )
+        )
+        # Members who left the server are ignored
+        members = map(self.guild.get_member, result.scalars().all())
+        return [member for member in members if member is not None]
+
+    async def get_schools(self, type: str, members_id: Iterable[int]) -> Dict[int, str]:
+        """
+        Returns the school of the given type of each member, if it is defined
+        """
+        column = SCHOOL_COLUMNS[type]
+        result = await database.execute_async(
+            select(MemberModel.id, column).where(
+                MemberModel.guild_id == self.guild.id,
+                MemberModel.id.in_(list(members_id)),
+                column.isnot(None),
+            )
+        )
+        return dict(result.all())
+
+    async def leaderboard_rank(
+        self, member_id: int, since: Optional[int] = None
+    ) -> Optional[Row]:
+        """
+        Returns (rank, messages_count) of a member in the leaderboard. The rank
+        counts the members with more messages, including those who left.
+        """
+        await messages_counter.flush()
+        counts = self._messages_counts(since).cte("counts")
+        messages_count = (
+            select(counts.c.messages_count)
+            .where(counts.c.id == member_id)
+            .scalar_subquery()
+        )
+        ahead = (
+            select(func.count())
+            .select_from(counts)
+            .where(counts.c.messages_count > messages_count)
+            .scalar_subquery()
+        )
+        result = await database.execute_async(
+            select((ahead + 1).label("rank"), messages_count.label("messages_count"))
+        )
+        if (row := result.first()) is None or row.messages_count is None:
+            return None  # Not registered, or no messages in the period
+        return row
+
     def get_member_by_name(self, member: str) -> Optional[discord.Member]:
         return discord.utils.get(self.members, name=member)
 
@@ -63,6 +262,26 @@ class GuildWrapper:
             return None
         return self.guild.get_role(self.config.roles[qualifier].id)
 
+    def get_roles_id(self, *qualifiers: str) -> FrozenSet[int]:
+        """
+        Returns the ids of the roles of the qualifiers, resolved once by wrapper
+        """
+        if (roles_id := self.__roles_id.get(qualifiers)) is None:
+            roles_id = set()
+            for qualifier in qualifiers:
+                if (role := self.get_role_by_qualifier(qualifier)) is None:
+                    logger.error(f"{qualifier} role is not defined in {self.guild}")
+                else:
+                    roles_id.add(role.id)
+            roles_id = self.__roles_id[qualifiers] = frozenset(roles_id)
+        return roles_id
+
+    def clear_roles_id(self) -> None:
+        """
+        Resolves qualifiers again on next checks, when roles of the guild change
+        """
+        self.__roles_id.clear()
+
     def get_emoji_by_name(self, name: str) -> Optional[discord.Emoji]:
         return discord.utils.get(self.guild.emojis, name=name)
 
@@ -99,7 +318,3 @@ class GuildWrapper:
     @property
     def roles_message_id(self) -> Optional[int]:
         return self.__model.roles_message_id
-
-    @roles_message_id.setter
-    def roles_message_id(self, message_id: Optional[int]):
-        self.update(roles_message_id=message_id)
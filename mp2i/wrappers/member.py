@@ -1,5 +1,6 @@
 import logging
-from typing import Optional
+import time
+from typing import Iterable, Optional, Tuple
 
 import discord
 from discord.ext.commands import MemberConverter
@@ -8,10 +9,45 @@ from sqlalchemy import insert, select, update
 
 from mp2i.models import MemberModel
 from mp2i.utils import database
+from mp2i.utils.cache import members_cache
+from mp2i.utils.counters import messages_counter
 from mp2i.wrappers.guild import GuildWrapper
 
 logger = logging.getLogger(__name__)
 
+REGISTER_CHUNK_SIZE = 250  # Rows by INSERT, stays under SQLite variables limit
+
+
+async def register_members(members: Iterable[discord.Member]) -> int:
+    """
+    Registers in bulk the members which are not yet in the database.
+    Returns the number of inserted members.
+    """
+    start = time.perf_counter()
+    members = list(members)
+    guilds_id = {member.guild.id for member in members}
+    result = await database.execute_async(
+        select(MemberModel.id, MemberModel.guild_id).where(
+            MemberModel.guild_id.in_(guilds_id)
+        )
+    )
+    existing = set(result.all())
+    missing = [
+        {"id": member.id, "guild_id": member.guild.id, "name": member.name}
+        for member in members
+        if (member.id, member.guild.id) not in existing
+    ]
+    for i in range(0, len(missing), REGISTER_CHUNK_SIZE):
+        chunk = missing[i : i + REGISTER_CHUNK_SIZE]
+        await database.execute_async(
+            database.insert_ignore(MemberModel.__table__).values(chunk)
+        )
+    logger.info(
+        f"{len(missing)} of {len(members)} members registered "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return len(missing)
+
 
 class MemberWrapper:
     """
@@ -23,14 +59,12 @@ class MemberWrapper:
 
     def __init__(self, member: discord.Member):
         """
-        Represents a member with additional attributes
+        Represents a member with additional attributes, use `fetch` to load the model
         """
         self.member = member
-        if not isinstance(member, discord.Member):
-            self.__model = None
-        else:
+        self.__model = None
+        if isinstance(member, discord.Member):
             self.guild = member.guild
-            self.__model = self._fetch()
 
     def __getattr__(self, name: str):
         return getattr(self.member, name)
@@ -41,42 +75,74 @@ class MemberWrapper:
     @classmethod
     async def convert(cls, ctx, member):
         member = await MemberConverter().convert(ctx, member)
-        return cls(member)
+        return await cls.fetch(member)
 
-    def _fetch(self) -> Optional[MemberModel]:
+    @classmethod
+    async def fetch(cls, member: discord.Member) -> "MemberWrapper":
+        """
+        Creates a wrapper and loads the member model from the cache or the database
+        """
+        wrapper = cls(member)
+        if not isinstance(member, discord.Member):
+            return wrapper
+        if (model := members_cache.get(wrapper._key)) is None:
+            if (model := await wrapper._fetch()) is not None:
+                members_cache.set(wrapper._key, model)
+        wrapper.__model = model
+        return wrapper
+
+    @property
+    def _key(self) -> Tuple[int, int]:
+        return self.guild.id, self.member.id
+
+    def _where(self) -> tuple:
+        return (
+            MemberModel.id == self.member.id,
+            MemberModel.guild_id == self.guild.id,
+        )
+
+    async def _fetch(self) -> Optional[MemberModel]:
         """
         Fetch from the database and returns the member if exists
         """
         try:
-            return database.execute(
-                select(MemberModel).where(
-                    MemberModel.id == self.member.id,
-                    MemberModel.guild_id == self.guild.id,
-                )
-            ).scalar_one()
+            result = await database.execute_async(
+                select(MemberModel).where(*self._where())
+            )
+            return result.scalar_one()
         except sqlalchemy.exc.NoResultFound:
             return None
 
-    def update(self, **kwargs) -> None:
+    async def _write(self, stmt) -> None:
+        """
+        Executes an INSERT or UPDATE and refreshes the model from the written row
+        """
+        query = select(*MemberModel.__table__.c).where(*self._where())
+        result = await database.execute_returning(stmt, query)
+        if result is not None and (row := result.first()) is not None:
+            self.__model = MemberModel(**row._mapping)
+        else:
+            self.__model = await self._fetch()  # The write failed, reload the row
+
+        if self.__model is None:
+            members_cache.pop(self._key)
+        else:
+            members_cache.set(self._key, self.__model)
+
+    async def update(self, **kwargs) -> None:
         """
         Accept keyword arguments only matching with a column in members table
         """
-        database.execute(
-            update(MemberModel)
-            .where(
-                MemberModel.id == self.member.id,
-                MemberModel.guild_id == self.guild.id,
-            )
-            .values(**kwargs)
+        await self._write(
+            update(MemberModel.__table__).where(*self._where()).values(**kwargs)
         )
-        self.__model = self._fetch()
 
-    def register(self, qualifier: Optional[str] = None) -> None:
+    async def register(self, qualifier: Optional[str] = None) -> None:
         """
         Insert the member in table, with optionals attributes
         """
-        database.execute(
-            insert(MemberModel).values(
+        await self._write(
+            insert(MemberModel.__table__).values(
                 id=self.member.id,
                 guild_id=self.guild.id,
                 name=self.member.name,
@@ -86,52 +152,33 @@ class MemberWrapper:
                 generation=None,
             )
         )
-        self.__model = self._fetch()  # Update the model
 
     def exists(self) -> bool:
         return self.__model is not None
 
     @property
     def role(self) -> Optional[discord.Role]:
-        guild = GuildWrapper(self.guild)
+        guild = GuildWrapper.get(self.guild)
         return guild.get_role_by_qualifier(self.__model.role)
 
     @property
     def messages_count(self) -> int:
-        return self.__model.messages_count
-
-    @messages_count.setter
-    def messages_count(self, value: int) -> None:
-        self.update(messages_count=value)
+        # Adds increments which are still buffered by the messages counter
+        pending = messages_counter.pending(self.guild.id, self.member.id)
+        return self.__model.messages_count + pending
 
     @property
     def profile_color(self) -> str:
         return self.__model.profile_color or self.DEFAULT_PROFILE_COLOR
 
-    @profile_color.setter
-    def profile_color(self, value: str) -> None:
-        self.update(profile_color=value)
-
     @property
     def high_school(self) -> str:
         return self.__model.high_school
 
-    @high_school.setter
-    def high_school(self, value: str) -> None:
-        self.update(high_school=value)
-
     @property
     def engineering_school(self) -> str:
         return self.__model.engineering_school
 
-    @engineering_school.setter
-    def engineering_school(self, value: str) -> None:
-        self.update(engineering_school=value)
-
     @property
     def generation(self) -> int:
         return self.__model.generation or 0
-
-    @generation.setter
-    def generation(self, value: int) -> None:
-        self.update(generation=value)
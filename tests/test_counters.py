@@ -0,0 +1,71 @@
+import asyncio
+import os
+from unittest import mock
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # Before the engine is created
+
+from sqlalchemy import delete, insert, select  # noqa: E402
+
+from mp2i.models import ActivityModel, GuildModel, MemberModel  # noqa: E402
+from mp2i.utils import database  # noqa: E402
+from mp2i.utils.counters import MessagesCounter  # noqa: E402
+
+GUILD_ID = 1
+MEMBER_ID = 100
+
+
+def setup_function() -> None:
+    database.execute(delete(GuildModel).where(GuildModel.id == GUILD_ID))
+    database.execute(delete(ActivityModel).where(ActivityModel.guild_id == GUILD_ID))
+    database.execute(insert(GuildModel).values(id=GUILD_ID, name="guild"))
+    database.execute(
+        insert(MemberModel).values(
+            id=MEMBER_ID, guild_id=GUILD_ID, name="member", messages_count=0
+        )
+    )
+
+
+def messages_count() -> int:
+    result = database.execute(
+        select(MemberModel.messages_count).where(MemberModel.id == MEMBER_ID)
+    )
+    return result.scalar()
+
+
+def activity_count() -> int:
+    result = database.execute(
+        select(ActivityModel.count).where(ActivityModel.guild_id == GUILD_ID)
+    )
+    return sum(result.scalars().all())
+
+
+def test_flush_only_counts() -> None:
+    counter = MessagesCounter()
+    counter._pending[GUILD_ID, MEMBER_ID] += 3
+    asyncio.run(counter.flush())
+    assert messages_count() == 3
+    assert not counter._pending and not counter._activity
+
+
+def test_flush_only_activity() -> None:
+    counter = MessagesCounter()
+    counter._activity[GUILD_ID, 10, MEMBER_ID, 1000] += 2
+    asyncio.run(counter.flush())
+    assert activity_count() == 2
+    assert messages_count() == 0
+    assert not counter._pending and not counter._activity
+
+
+def test_flush_keeps_buffers_on_error() -> None:
+    counter = MessagesCounter()
+
+    async def increment_and_fail() -> None:
+        await counter.increment(GUILD_ID, 10, MEMBER_ID)
+        with mock.patch.object(database, "execute_async", side_effect=RuntimeError):
+            await counter.flush()
+        assert counter.pending(GUILD_ID, MEMBER_ID) == 1
+        await counter.flush()  # Retried without a new message
+
+    asyncio.run(increment_and_fail())
+    assert messages_count() == 1
+    assert activity_count() == 1